@@ -1,39 +1,142 @@
+import sys
+import time
+# startup timings: a cold start (new process) is the first run to import the modules below
+_script_start = time.perf_counter()
+_cold_start = 'modules.cloud' not in sys.modules
 import streamlit as st
-from modules.cloud import query_feature_set, query_all_card_types
-from modules.processing import agg_by_set, agg_by_release, select_by_date, clip_sets, get_winners, get_ripe_boxes, get_baby_sets, get_baby_boxes
-from modules.analysis import summarize_dataframe
-from modules.viz import Plotter
+from modules.cloud import query_features, query_all_card_types, submit_query, data_version
+from modules.artifacts import latest_version, read_artifact, read_manifest
+from modules.charts import make_plotter
+from modules.cube import ReleaseCube
+from modules.indices import MAJOR_INDICES, MarketIndices, index_columns
+from modules.movers import top_movers, build_tracking_index
+from modules.pipeline import (MOVER_COLUMNS, ROW_LIMIT, SPRITE_GRADE, dashboard_window, dashboard_filters, build_movers,
+                              build_card_features, build_sprite_stats, build_summary, build_set_aggregates, set_lists, index_levels_long, summary_from_frame)
+from modules.processing import SET_METRIC_COLS
+from modules.predict import PredictionClient, PREDICT_URL, PREDICT_BATCH_URL
+from modules.similarity import SimilarCards
+from modules.viz import Plotter, figure_to_bytes
+from modules.visuals import add_pokemon_sprites
+from modules.instrument import DEBUG, start_run, stage, timed, record_stage, show_debug_panel
 from modules.config import feature_descriptions, intro_md
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
-import numpy as np
+import pandas as pd
+import os
+import requests
+_imports_seconds = time.perf_counter() - _script_start
 
 
 st.set_page_config(page_title="Pokémon Market Analysis", layout="centered")
 
+# per-stage timings, shown at the bottom with POKE_DEBUG=1 (always logged)
+start_run()
+record_stage("startup: imports", _imports_seconds, cold=_cold_start)
+
 #st.title('PokeAnalytics')
 st.markdown(intro_md)
+record_stage("startup: intro", time.perf_counter() - _script_start, cold=_cold_start)
 
 
-data_load_state = st.text('loading data...')
-df = query_feature_set(limit=300000)
-data_load_state.text("Data loaded")
-if "Unnamed: 0" in df.columns:
-    df = df.drop(columns=["Unnamed: 0"])
-
-# raw / summary
-summary_df = summarize_dataframe(df)
+# SERVE_PRECOMPUTED=1 serves the latest run of the precompute job (python -m modules.pipeline) and never queries
+# the database; otherwise every section is computed here
+artifact_version = latest_version() if os.getenv("SERVE_PRECOMPUTED") == "1" else None
+if os.getenv("SERVE_PRECOMPUTED") == "1" and artifact_version is None:
+    print("app: SERVE_PRECOMPUTED is set but there are no artifacts yet, computing live")
 
-# Selection and clipping
-start = '2021-01'
-end = '2024-11' # yyyy-mm of current month
+@st.cache_data(show_spinner=False)
+def load_manifest(version):
+    return read_manifest(version)
 
-filtered_df = select_by_date(df, start, end)
+# Selection and clipping: date range (yyyy-mm, end is the current month) and last month, from the job's run when precomputed
+window = load_manifest(artifact_version)['values']['window'] if artifact_version else dashboard_window()
+start, end, clipped_tail = window['start'], window['end'], window['clipped_tail']
+filters = dashboard_filters(window)
 start_formatted = datetime.strptime(start, "%Y-%m").strftime("%m-%Y")
 end_formatted = datetime.strptime(end, "%Y-%m").strftime("%m-%Y")
-# remove 1st 2 months of release data per set
-filtered_df = clip_sets(filtered_df)
-filtered_df = filtered_df.loc[filtered_df.price>0]
+
+# Section data is memoized on small inputs (not on the frames), so it's shared across sessions and reruns
+# and the widget sections below (fragments) rerun on their own without recomputing anything else.
+# With an artifact version the loaders only read that run's outputs. Live, they're keyed on the served data version
+# (cloud.data_version), so they recompute once after the query cache swaps in a scraper run's data. Each keeps the
+# current and previous version's entry (max_entries=2), older ones are evicted rather than piling up per version.
+live_version = None if artifact_version else data_version()
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_movers(months=3, version=None, data_version=None):
+    if version:
+        return timed("read: movers")(read_artifact)('movers', version)
+    df = timed("query: movers columns")(query_features)(columns=MOVER_COLUMNS, limit=ROW_LIMIT)
+    return build_movers(df, months=months)
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_card_features(window=6, version=None, data_version=None):
+    if version:
+        return timed("read: card features")(read_artifact)('card_features', version)
+    # same query as load_movers, so it's served from the same cached frame
+    df = timed("query: movers columns")(query_features)(columns=MOVER_COLUMNS, limit=ROW_LIMIT)
+    return build_card_features(df, window=window)
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_summary(filters, version=None, data_version=None):
+    if version:
+        values = load_manifest(version)['values']
+        summary_df = summary_from_frame(timed("read: summary")(read_artifact)('summary', version))
+        return summary_df, tuple(values['filtered_shape']), values['unique_card_count']
+    filtered_df = timed("query: filtered")(query_features)(filters=filters, limit=ROW_LIMIT)
+    return build_summary(filtered_df)
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_set_aggregates(filters, clipped_tail, version=None, data_version=None):
+    if version:
+        agg_by_set_df = timed("read: agg_by_set")(read_artifact)('agg_by_set', version)
+        release_cube = ReleaseCube.from_frame(timed("read: release cube")(read_artifact)('release_cube', version), SET_METRIC_COLS)
+        agg_modern_sets = timed("read: agg_modern_sets")(read_artifact)('agg_modern_sets', version)
+        return agg_by_set_df, release_cube, agg_modern_sets
+    filtered_df = timed("query: filtered")(query_features)(filters=filters, limit=ROW_LIMIT)
+    return build_set_aggregates(filtered_df, clipped_tail)
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_card_types(version=None, data_version=None):
+    if version:
+        return timed("read: card types")(read_artifact)('card_types', version)
+    return query_all_card_types()
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_sprite_stats(version=None, data_version=None):
+    if version:
+        # artifacts from before the sprite captions have none
+        return load_manifest(version)['values'].get('sprite_stats', {})
+    # all time prices, so the movers' (unfiltered) frame rather than the dashboard window
+    df = timed("query: movers columns")(query_features)(columns=MOVER_COLUMNS, limit=ROW_LIMIT)
+    return build_sprite_stats(df)
+
+# indices are kept per process and only fold in the months since their last update
+@st.cache_resource(show_spinner=False)
+def market_indices():
+    return MarketIndices(MAJOR_INDICES)
+
+def load_market_indices(version=None):
+    if version:
+        return timed("read: market indices")(read_artifact)('market_indices', version)
+    indices = market_indices()
+    # the last month is pulled again, it may have been partial
+    since = () if indices.last_month is None else (('date', '>=', indices.last_month),)
+    new_rows = timed("query: index columns")(query_features)(columns=index_columns(), filters=since)
+    levels = timed("market indices")(indices.update)(new_rows)
+    return index_levels_long(levels)
+
+# independent loads start together and run side by side; each is waited on where it's used
+data_load_state = st.text('loading data...')
+movers_future = submit_query(load_movers, months=3, version=artifact_version, data_version=live_version)
+summary_future = submit_query(load_summary, filters, version=artifact_version, data_version=live_version)
+aggregates_future = submit_query(load_set_aggregates, filters, clipped_tail, version=artifact_version, data_version=live_version)
+card_types_future = submit_query(load_card_types, version=artifact_version, data_version=live_version)
+indices_future = submit_query(load_market_indices, version=artifact_version)
+card_features_future = submit_query(load_card_features, window=6, version=artifact_version, data_version=live_version)
+sprites_future = submit_query(load_sprite_stats, version=artifact_version, data_version=live_version)
+
+summary_df, filtered_shape, unique_card_count = timed("load: summary")(summary_future.result)()
+data_load_state.text("Data loaded")
 
 
 
@@ -43,57 +146,87 @@ title="Price Movement Predictor"
 st.subheader(title)
 # (card prices are very difficult to predict accurately even month to month due many factors like - hype in the collector space, subjectivity of what the fanbase deems a cool card, and perhaps not enough descriptive features in this model. As such, it is advised to use this tool merely for entertainment purposes or scrappy experimentation)
 st.markdown("in progress")
-fastapi_url="https://"
-with st.form(key='input_form'):
-    # Collecting input from user
-    mos_since_release = st.text_input('Months since set was released', value=1)
-    num_grade = st.slider('PSA Grade (8 for near mint/raw cards)', min_value=1, max_value=10, value=8)
-    is_secret = st.checkbox('Secret rare')
-    is_full_art = st.checkbox('Full Art')
-    is_tag_team = st.checkbox('Tag Team')
-    is_alt_art = st.checkbox('Alt Art')
-    is_eeveelution = st.checkbox('Eeveelution')
-    is_legendary = st.checkbox('Legendary (gen1-4)')
-    is_og_char = st.checkbox('Nolstagic Favorite (see below)')
-    ir_score = st.text_input('Illustration Rare Score (0=NA, 1=IR, 2=SIR)', value="0")
-    num_predictions = st.slider('months to forecast', min_value=1, max_value=11, value=1)
-
-    # Submit button for the form
-    submit_button = st.form_submit_button(label='Predict Price Movements (Coming soon)')
-
-# Convert input data to the appropriate format
-if submit_button:
-    input_data = {
-        "mos_since_release": mos_since_release,
-        "num_grade": num_grade,
-        "is_secret": int(is_secret),  # FastAPI expects boolean 0 or 1
-        "is_full_art": int(is_full_art),
-        "is_tag_team": int(is_tag_team),
-        "is_alt_art": int(is_alt_art),
-        "is_eeveelution": int(is_eeveelution),
-        "is_legendary": int(is_legendary),
-        "is_og_char": int(is_og_char),
-        "ir_score": int(ir_score),
-        "num_predictions": int(num_predictions)+1
-    }
-
-st.markdown("built with XGBoost and FastAPI, deploying with either Heroku or SageMaker endpoints...")
-    # Send the data to the FastAPI model for prediction
-    #try:
-    #    response = requests.post(fastapi_url, json=input_data)
-    #    
-    #    if response.status_code == 200:
-    #        # Parse and display the result
-    #        result = response.json()
-    #        st.write(f"Predicted Price: ${result['price']:.2f}")
-    #    else:
-    #        st.error(f"Error: {response.status_code} - {response.text}")
-    #except Exception as e:
-    #    st.error(f"An error occurred: {e}")
-
-# Given user inputs, search df for cards with matching attributes/filters, average, plot and validate    
-# against our [%,%,%,%] and avg % prediction payloads
-# plot here title = "Cards like this performed like"
+
+# one pooled, caching client per process; the predictor is off until PREDICT_URL points at the model endpoint
+@st.cache_resource(show_spinner=False)
+def prediction_client():
+    return PredictionClient(PREDICT_URL, batch_url=PREDICT_BATCH_URL) if PREDICT_URL else None
+
+# attribute index for "cards like this", built once per process from the filtered rows
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_similar_cards(filters, version=None, data_version=None):
+    if version:
+        return SimilarCards.from_buckets(read_artifact('similar_buckets', version), read_artifact('similar_cards', version))
+    filtered_df = timed("query: filtered")(query_features)(filters=filters, limit=ROW_LIMIT)
+    return timed("similar cards index")(SimilarCards.from_frame)(filtered_df)
+
+# the form's PSA grade slider to the grades priced in feature_set (8 stands for near mint/raw)
+SLIDER_GRADES = {10: 'psa_10', 9: 'psa_9', 8: 'nearmint', 7: 'psa_7'}
+
+# a fragment, so submitting the form reruns only this section
+@st.fragment
+def price_predictor():
+    with st.form(key='input_form'):
+        # Collecting input from user
+        mos_since_release = st.text_input('Months since set was released', value=1)
+        num_grade = st.slider('PSA Grade (8 for near mint/raw cards)', min_value=1, max_value=10, value=8)
+        is_secret = st.checkbox('Secret rare')
+        is_full_art = st.checkbox('Full Art')
+        is_tag_team = st.checkbox('Tag Team')
+        is_alt_art = st.checkbox('Alt Art')
+        is_eeveelution = st.checkbox('Eeveelution')
+        is_legendary = st.checkbox('Legendary (gen1-4)')
+        is_og_char = st.checkbox('Nolstagic Favorite (see below)')
+        ir_score = st.text_input('Illustration Rare Score (0=NA, 1=IR, 2=SIR)', value="0")
+        num_predictions = st.slider('months to forecast', min_value=1, max_value=11, value=1)
+
+        # Submit button for the form
+        submit_button = st.form_submit_button(label='Predict Price Movements (Coming soon)')
+
+    # Convert input data to the appropriate format
+    if submit_button:
+        input_data = {
+            "mos_since_release": mos_since_release,
+            "num_grade": num_grade,
+            "is_secret": int(is_secret),  # FastAPI expects boolean 0 or 1
+            "is_full_art": int(is_full_art),
+            "is_tag_team": int(is_tag_team),
+            "is_alt_art": int(is_alt_art),
+            "is_eeveelution": int(is_eeveelution),
+            "is_legendary": int(is_legendary),
+            "is_og_char": int(is_og_char),
+            "ir_score": int(ir_score),
+            "num_predictions": int(num_predictions)+1
+        }
+
+        # Send the data to the FastAPI model for prediction
+        client = prediction_client()
+        if client is not None:
+            try:
+                result = timed("predict")(client.predict)(input_data)
+                st.write(f"Predicted Price: ${result['price']:.2f}")
+            except requests.HTTPError as e:
+                st.error(f"Error: {e.response.status_code} - {e.response.text}")
+            except Exception as e:
+                st.error(f"An error occurred: {e}")
+
+        # Given user inputs, search for cards with matching attributes (or the nearest ones), average and plot
+        grade = SLIDER_GRADES.get(num_grade, 'psa_7')
+        trajectory, distance, n_cards = load_similar_cards(filters, artifact_version, live_version).trajectory(input_data, ir_score=input_data["ir_score"], grade=grade)
+        st.subheader("Cards like this performed like")
+        if n_cards == 0:
+            st.write(f"No {grade} cards to compare with")
+        else:
+            match = "matching attributes" if distance == 0 else f"the nearest attributes ({distance} differing)"
+            st.caption(f"average {grade} price of {n_cards} cards with {match}, by months since release")
+            similar_plotter = make_plotter(title="", xlabel="months since release", ylabel="price (USD)")
+            similar_plotter.show(st, similar_plotter.render_basic(trajectory, x='mos_since_release', y='avg_price'))
+
+    st.markdown("built with XGBoost and FastAPI, deploying with either Heroku or SageMaker endpoints...")
+
+price_predictor()
+
+# Validate the similar cards' trajectories against our [%,%,%,%] and avg % prediction payloads
 
 st.markdown("\n")
 title="Feature Importance"
@@ -105,88 +238,39 @@ st.markdown("\n")
 ##------------------------------------------------------------------------------------------------------------
 st.markdown("---")
 st.subheader("Price tracking across sets")
-# Select the 3 most recent prices for each poke_id
-#latest_prices = df[df['price'] > 0]
-df = df.sort_values(by='date', ascending=True)
-
-latest_prices = df.groupby(['poke_id', 'grade']).tail(3)
-
-# Aggregate by poke_name, poke_id, grade, and set_name to include the set_name in the result
-last_3mo_avg = latest_prices.groupby(['poke_name', 'poke_no', 'grade', 'set_name']).agg({'price': 'mean'}).reset_index()
-
-# Calculate the price for the most recent month (first price for each poke_id, grouped by grade)
-last_mo = latest_prices.groupby(['poke_name', 'poke_no', 'grade', 'set_name']).agg({'price': 'last'}).reset_index()
-# Merge the two DataFrames on poke_name, grade, poke_id, and set_name
-metrics = last_3mo_avg.merge(last_mo, on=["poke_name", "grade", "poke_no", "set_name"])
-
-# Rename the columns for clarity
-metrics.rename(columns={'price_x': 'last_3mo_avg_price', 'price_y': 'last_mo_price'}, inplace=True)
-
-# Calculate the percent change between last_3mo_avg_price and last_mo_price
-metrics['perc_change'] = ((metrics['last_mo_price'] - metrics['last_3mo_avg_price']) / metrics['last_3mo_avg_price']) * 100
-metrics['perc_change'].replace([np.inf, -np.inf, np.nan], 0, inplace=True)
-
-# Round the perc_change column to integers
-metrics['perc_change'] = metrics['perc_change'].round(0).astype(int)
-
-release_data = df[['set_name', 'release_date']].groupby("set_name").first()
-metrics = metrics.merge(release_data, on='set_name', how='left')
-import pandas as pd
-# Ensure 'release_date' is in datetime format
-metrics['release_date'] = pd.to_datetime(metrics['release_date'])
-
-# Sort the set_name filter by release_date
-sorted_sets = metrics.sort_values('release_date', ascending=False)['set_name'].unique()
+movers = timed("load: movers")(movers_future.result)()
 
 # Order the grade filter manually
 grade_order = ['nearmint', 'psa_10', 'psa_9', 'psa_8', 'psa_7', 'bgs_9_half']
 
-# Set 'grade' as a categorical column with the custom order
-metrics['grade'] = pd.Categorical(metrics['grade'], categories=grade_order, ordered=True)
-
-# Now, use the categories to sort the unique values in the 'grade' column
-sorted_grades = metrics['grade'].cat.categories
+# one table per (set, grade), built once per process and shared read-only by every session
+@st.cache_resource(show_spinner=False, max_entries=2)
+def load_tracking_index(months=3, version=None, data_version=None):
+    return timed("build_tracking_index")(build_tracking_index)(load_movers(months, version, data_version))
 
-# Set up Streamlit filters
-set_name_filter = st.selectbox("Select Set", sorted_sets)
-grade_filter = st.selectbox("Select Grade", sorted_grades)
+tracking_index, sorted_sets = load_tracking_index(months=3, version=artifact_version, data_version=live_version)
 
-# Filter the view based on selected set_name and grade
-view = metrics[(metrics['set_name'] == set_name_filter) & (metrics['grade'] == grade_filter)]
+# a fragment, so changing the set/grade reruns only this table
+@st.fragment
+def price_tracking_table(tracking_index, sorted_sets, sorted_grades):
+    # Set up Streamlit filters
+    set_name_filter = st.selectbox("Select Set", sorted_sets)
+    grade_filter = st.selectbox("Select Grade", sorted_grades)
 
-# Drop the set_name column for clarity in the final display
-view = view.drop(columns=['set_name', 'release_date'])
+    # already sorted by last_mo_price; an empty selection shows an empty table
+    view = tracking_index.get((set_name_filter, grade_filter))
+    if view is None:
+        view = pd.DataFrame(columns=['poke_name', 'poke_no', 'grade', 'last_3mo_avg_price', 'last_mo_price', 'perc_change'])
+    st.dataframe(view)
 
-# Display the filtered and sorted view in Streamlit
-st.dataframe(view.sort_values("last_mo_price", ascending=False))
+price_tracking_table(tracking_index, sorted_sets, grade_order)
 
 ##-----------------------
 
 st.markdown("---")
 st.subheader("Top near mint movers over 25 USD")
-# Select the 3 most recent prices for each poke_id
-raw = df.loc[(df['grade'] == "nearmint") & (df['product_type'] != "sealed")]
-latest_prices = raw.groupby('poke_id').tail(3)
-# Aggregate by poke_name, poke_id, grade, and set_name to include the set_name in the result
-last_3mo_avg = latest_prices.groupby(['poke_name', 'set_name', 'poke_no']).agg({'price': 'mean'}).reset_index()
-
-# Calculate the price for the most recent month (first price for each poke_id, grouped by grade)
-last_mo = latest_prices.groupby(['poke_name', 'set_name', 'poke_no']).agg({'price': 'last'}).reset_index()
-
-# Merge the two DataFrames on poke_name, grade, poke_id, and set_name
-metrics = last_3mo_avg.merge(last_mo, on=["poke_name", 'set_name', "poke_no"])
-
-# Rename the columns for clarity
-metrics.rename(columns={'price_x': 'last_3mo_avg_price', 'price_y': 'last_mo_price'}, inplace=True)
-
-# Calculate the percent change between last_3mo_avg_price and last_mo_price
-metrics['perc_change'] = ((metrics['last_mo_price'] - metrics['last_3mo_avg_price']) / metrics['last_3mo_avg_price']) * 100
-metrics['perc_change'].replace([np.inf, -np.inf, np.nan], 0, inplace=True)
-
-# Round the perc_change column to integers
-metrics['perc_change'] = metrics['perc_change'].round(0).astype(int)
-
-top_50 = metrics.loc[metrics.last_mo_price>=25].sort_values("perc_change", ascending=False)
+raw = movers.loc[(movers['grade'] == "nearmint") & (movers['product_type'] != "sealed")]
+top_50 = top_movers(raw, min_price=25)[['poke_name', 'set_name', 'poke_no', 'last_3mo_avg_price', 'last_mo_price', 'perc_change']]
 
 st.dataframe(top_50)
 
@@ -194,80 +278,66 @@ st.dataframe(top_50)
 
 st.markdown("---")
 st.subheader("Booster boxes")
-# Select the 3 most recent prices for each poke_id
-raw = df.loc[df.poke_name=="booster-box"]
-latest_prices = raw.groupby('poke_id').tail(3)
-# Aggregate by poke_name, poke_id, grade, and set_name to include the set_name in the result
-last_3mo_avg = latest_prices.groupby(['poke_name', 'set_name']).agg({'price': 'mean'}).reset_index()
-
-# Calculate the price for the most recent month (first price for each poke_id, grouped by grade)
-last_mo = latest_prices.groupby(['poke_name', 'set_name', 'poke_no']).agg({'price': 'last'}).reset_index()
-
-# Merge the two DataFrames on poke_name, grade, poke_id, and set_name
-metrics = last_3mo_avg.merge(last_mo, on=["poke_name", 'set_name'])
-
-# Rename the columns for clarity
-metrics.rename(columns={'price_x': 'last_3mo_avg_price', 'price_y': 'last_mo_price'}, inplace=True)
-
-# Calculate the percent change between last_3mo_avg_price and last_mo_price
-metrics['perc_change'] = ((metrics['last_mo_price'] - metrics['last_3mo_avg_price']) / metrics['last_3mo_avg_price']) * 100
-metrics['perc_change'].replace([np.inf, -np.inf, np.nan], 0, inplace=True)
+raw = movers.loc[movers['poke_name'] == "booster-box"]
+metrics = top_movers(raw, min_price=25)[['set_name', 'grade', 'last_3mo_avg_price', 'last_mo_price', 'perc_change']]
+st.dataframe(metrics)
 
-# Round the perc_change column to integers
-metrics['perc_change'] = metrics['perc_change'].round(0).astype(int)
-metrics = metrics.loc[metrics.last_mo_price>=25].sort_values("perc_change", ascending=False)
+##-----------------------
 
-metrics = metrics.drop(columns=['poke_name', 'poke_no'])
-st.dataframe(metrics)
+st.markdown("---")
+st.subheader("Near mint momentum over 25 USD: 6 month return")
+card_features = timed("load: card features")(card_features_future.result)()
+raw = card_features.loc[(card_features['grade'] == "nearmint") & (card_features['product_type'] != "sealed") & (card_features['last_price'] >= 25)]
+momentum = raw.sort_values('ret_6m', ascending=False).head(50)
+st.dataframe(momentum[['poke_name', 'set_name', 'poke_no', 'last_price', 'ret_6m', 'vol_6m', 'max_drawdown', 'months_since_peak']])
+st.markdown("- returns, volatility (std of monthly returns) and drawdown from the all time high are fractions, e.g. 0.25 = 25%")
 
 #------
 st.markdown("---")
 st.subheader('Visualizations')
 st.markdown("*Card Price Predictor was trained on a subset of this data* ")
-st.markdown(f"""- selected data date range: ({start_formatted} to {end_formatted})\n- data of dimension: {filtered_df.shape}""")
-
-last_month = datetime.today()- relativedelta(months=1)
-clipped_tail = last_month.strftime("%Y-%m")
+st.markdown(f"""- selected data date range: ({start_formatted} to {end_formatted})\n- data of dimension: {filtered_shape}""")
 
 ### Set Values
-agg_by_set_df = agg_by_set(filtered_df)
-agg_by_release_df = agg_by_release(filtered_df)
+agg_by_set_df, release_cube, agg_modern_sets = timed("load: set aggregates")(aggregates_future.result)()
+# winners, unripe sets, matured and cheaper boxes
+set_groups = set_lists(agg_by_set_df)
+
 
+# server side images, or client side (vega-lite) charts with CHART_BACKEND=vega
+modern_line_plts = make_plotter(title="", xlabel="date (monthly)", ylabel="price (USD)")
+# charts are laid out as placeholders first, then rendered together (across a process pool for matplotlib)
+chart_slots, chart_specs = [], []
+def queue_chart(data, y, **overrides):
+    chart_slots.append(st.empty())
+    chart_specs.append({**dict(data=data, x='date', y=y, kind="line", hue="set_name"), **overrides})
 
-modern_line_plts = Plotter(title="", xlabel="date (monthly)", ylabel="price (USD)")
 feature = "top10_nm_card_mo_sum_in_set"
 title = "All set card values: sum of top 10 cards" # basically ~= average cost of near mint
 st.subheader(title)
-top10_nm_card_mo_sum_in_set = modern_line_plts.plot_basic(agg_by_set_df, x='date', y=feature, kind="line", hue="set_name")
-st.pyplot(top10_nm_card_mo_sum_in_set)
+queue_chart(agg_by_set_df, y=feature)
 st.markdown("\n")
 
-big_sets = get_winners(agg_by_set_df)
+big_sets = set_groups['winners']
 winners = agg_by_set_df[agg_by_set_df['set_name'].isin(big_sets)]
 winners=winners.loc[winners.date<clipped_tail]
 title = "Mid range sets ($700-1250): sum of top 10 cards"
 st.subheader(title)
 semi_winners = winners[~winners['set_name'].isin(['evolving-skies', 'team-up'])]
-top10_nm_card_mo_sum_in_winning_sets = modern_line_plts.plot_basic(semi_winners, x='date', y=feature, kind="line", hue="set_name")
-st.pyplot(top10_nm_card_mo_sum_in_winning_sets)
+queue_chart(semi_winners, y=feature)
 st.markdown("\n")
 
-small_sets = get_baby_sets(agg_by_set_df)
+small_sets = set_groups['baby_sets']
 baby_sets = agg_by_set_df[agg_by_set_df['set_name'].isin(small_sets)]
 baby_sets = baby_sets.loc[baby_sets.date<=clipped_tail]
 title = "Unripe sets (less than $700): sum of top 10 cards"
 st.subheader(title)
-top10_nm_card_mo_sum_in_winning_sets = modern_line_plts.plot_basic(baby_sets, x='date', y=feature, kind="line", hue="set_name")
-st.pyplot(top10_nm_card_mo_sum_in_winning_sets)
+queue_chart(baby_sets, y=feature)
 st.markdown("\n")
 
-modern_sets = filtered_df.loc[filtered_df.release_date>="2022"].reset_index()
-modern_sets = modern_sets.loc[modern_sets.date<clipped_tail]
-agg_modern_sets = agg_by_set(modern_sets)
 title = "Modern sets (2022+ release): sum of top 10 cards"
 st.subheader(title)
-top10_nm_card_mo_sum_modern = modern_line_plts.plot_basic(agg_modern_sets, x='date', y=feature, kind="line", hue="set_name")
-st.pyplot(top10_nm_card_mo_sum_modern)
+queue_chart(agg_modern_sets, y=feature)
 st.markdown("\n")
 
 
@@ -277,26 +347,33 @@ feature = "bb_mo_price_by_set"
 title = "All booster boxes: sell prices"
 st.subheader(title)
 exclude_words = ['crown-zenith', 'scarlet-&-violet-151', 'champions-path', 'paldean fates', 'hidden-fates', 'shining-fates']
-bb_mo_price_by_set = modern_line_plts.plot_basic(agg_by_set_df[~agg_by_set_df['set_name'].isin(exclude_words)], x='date', y=feature, kind="line", hue="set_name")
-st.pyplot(bb_mo_price_by_set)
+queue_chart(agg_by_set_df[~agg_by_set_df['set_name'].isin(exclude_words)], y=feature)
 st.markdown("\n")
 
 exclude_words = ['crown-zenith', 'scarlet-&-violet-151', 'champions-path', 'paldean fates', 'hidden-fates', 'shining-fates']
-ripe_boxes_set_names = get_ripe_boxes(agg_by_set_df)
+ripe_boxes_set_names = set_groups['ripe_boxes']
 ripe_boxes = agg_by_set_df[agg_by_set_df['set_name'].isin(ripe_boxes_set_names)]
 title = "Matured booster boxes: sell price \$200-$1000"
 exclude_words = ['crown-zenith', 'scarlet-&-violet-151', 'champions-path', 'paldean fates', 'hidden-fates', 'shining-fates']
 st.subheader(title)
-bb_mo_price_by_set_ripe = modern_line_plts.plot_basic(ripe_boxes, x='date', y=feature, kind="line", hue="set_name")
-st.pyplot(bb_mo_price_by_set_ripe)
+queue_chart(ripe_boxes, y=feature)
 st.markdown("\n")
 
-young_boxes_set_names = get_baby_boxes(agg_by_set_df)
+young_boxes_set_names = set_groups['baby_boxes']
 young_boxes = agg_by_set_df[agg_by_set_df['set_name'].isin(young_boxes_set_names)]
 title = "Cheaper booster boxes: sell price <$200"
 st.subheader(title)
-bb_mo_price_by_set_ripe = modern_line_plts.plot_basic(young_boxes, x='date', y=feature, kind="line", hue="set_name")
-st.pyplot(bb_mo_price_by_set_ripe)
+queue_chart(young_boxes, y=feature)
+st.markdown("\n")
+
+
+st.markdown("---")
+### Market indices
+market_index_levels = timed("load: market indices")(indices_future.result)()
+title = "Market indices: card price indices (100 = first month)"
+st.subheader(title)
+queue_chart(market_index_levels, y="level", hue="index", ylabel="index level")
+st.markdown("- chain linked monthly returns of the near mint cards in each group (PSA 10 for charizard psa 10), equal or price weighted")
 st.markdown("\n")
 
 
@@ -306,50 +383,51 @@ title = "Average PSA 10 Price per set"
 st.subheader(title)
 
 feature = 'avg_mo_price_psa_10_in_set'
-avg_mo_price_psa_10_in_set = modern_line_plts.plot_basic(agg_by_set_df, x='date', y=feature, kind="line", hue="set_name")
-st.pyplot(avg_mo_price_psa_10_in_set)
+queue_chart(agg_by_set_df, y=feature)
 st.markdown("\n")
 
 feature = 'avg_mo_price_sealed_in_set'
 title = "Average sealed price per set"
 st.subheader(title)
-avg_mo_price_sealed_in_set = modern_line_plts.plot_basic(agg_by_set_df, x='date', y=feature, kind="line", hue="set_name")
-st.pyplot(avg_mo_price_sealed_in_set)
+queue_chart(agg_by_set_df, y=feature)
 st.markdown("\n")
 
-modern_line_plts = Plotter(title="", xlabel="date (monthly)", ylabel="")
 feature = 'top10_mo_card_sum_to_bb_cost_ratio'
 title = "Top 10 card value to Booster box cost ratio"
 st.subheader(title)
-top10_mo_card_sum_to_bb_cost_ratio = modern_line_plts.plot_basic(agg_by_set_df.loc[agg_by_set_df.date>='2022-01'], x='date', y=feature, kind="line", hue="set_name")
-st.pyplot(top10_mo_card_sum_to_bb_cost_ratio)
+queue_chart(agg_by_set_df.loc[agg_by_set_df.date>='2022-01'], y=feature, ylabel="")
 st.markdown("- i.e. a set with a \$500 total top 10 NM card cost, and a booster box cost of $100, has a ratio of 5.0")
 st.markdown("\n")
 
+with stage("charts", rows_in=len(chart_specs)):
+    images = modern_line_plts.render_many(chart_specs)
+for slot, image in zip(chart_slots, images):
+    modern_line_plts.show(slot, image)
+
 
 st.markdown("---")
-# deduplicate and copy
-print(f'...saving copy of deduped data (by poke_id & set_year) to analyze later...starting with {len(df)} rows')
-unique_df = filtered_df.drop_duplicates(subset=['poke_name', "poke_id", 'set_year'], keep='first')
-unique_df = unique_df.loc[unique_df.product_type == "card"]
-unique_summary = summarize_dataframe(filtered_df)
+unique_summary = summary_df
 
 # non-aggregate visualizations (deduplicated/unique pokemon df usually)
 plotter = Plotter(title="", xlabel="card type", ylabel="Percentage")
-fig = plotter.plot_is_columns_bar_plot(unique_summary)
-st.subheader(f"Card types among the unique, scraped cards ({len(unique_df)})")
-st.pyplot(fig)
+with stage("chart: card type shares"):
+    fig = figure_to_bytes(plotter.plot_is_columns_bar_plot(unique_summary))
+st.subheader(f"Card types among the unique, scraped cards ({unique_card_count})")
+st.image(fig)
 st.markdown(f'- og_char: {feature_descriptions["is_og_char"]}')
 st.markdown(f'- legendary: {feature_descriptions["is_legendary"]}')
 
 
-card_types = query_all_card_types()
-st.subheader(f"{len(card_types)} most common PSA card types (50+ req.)")
+card_types = timed("load: card types")(card_types_future.result)()
+# None when psa_data couldn't be counted (the error is shown), the rest of the page still renders
+if card_types is not None:
+    st.subheader(f"{len(card_types)} most common PSA card types (50+ req.)")
 
-plotter = Plotter(title="Card Type Histogram", xlabel="Card Type", ylabel="Frequency")
-# Plot histogram of card types with at least 3 occurrences
-fig = plotter.plot_histogram(data=card_types, x='card_type', weights_column='count', bins=10)
-st.pyplot(fig)
+    plotter = Plotter(title="Card Type Histogram", xlabel="Card Type", ylabel="Frequency")
+    # Plot histogram of card types with at least 3 occurrences
+    with stage("chart: card type histogram", rows_in=len(card_types)):
+        fig = figure_to_bytes(plotter.plot_histogram(data=card_types, x='card_type', weights_column='count', bins=10))
+    st.image(fig)
 
 
 st.markdown("---")
@@ -358,11 +436,17 @@ st.write(summary_df)
 
 
 
+add_pokemon_sprites(timed("load: sprite stats")(sprites_future.result)(), grade=SPRITE_GRADE)
+
+
 st.markdown("---")
 st.write(" Thanks for visiting!")
 st.write("💡Have ideas, need data, or want to collaborate? Feel free to reach out!")
 st.write("[LinkedIn](https://www.linkedin.com/in/kennethh123/) | [Github](https://github.com/kennneth1)")
 st.write("— Kenneth H.")
 
+if DEBUG:
+    show_debug_panel()
+
 
 
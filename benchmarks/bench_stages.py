@@ -0,0 +1,84 @@
+"""
+Times and memory-profiles each stage of the dashboard pipeline on synthetic feature_set frames.
+
+    python -m benchmarks.bench_stages                    # 100k, 1M and 10M rows
+    python -m benchmarks.bench_stages --rows 100000 --json bench_output.json
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+import matplotlib
+matplotlib.use("Agg")
+
+from modules.analysis import summarize_dataframe
+from modules.movers import compute_movers
+from modules.card_features import card_features
+from modules.cube import ReleaseCube
+from modules.processing import SET_METRIC_COLS, agg_by_set, agg_by_release, select_by_date, clip_sets
+from modules.synthetic import make_feature_set_rows
+from modules.viz import Plotter
+
+
+def measure(stage, rows, func, *args):
+    """
+    Runs func(*args) once and returns its result plus a record of wall time and peak traced memory.
+    """
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    record = {'stage': stage, 'rows': rows, 'seconds': round(seconds, 4), 'peak_mb': round(peak / 1e6, 1)}
+    print(f"{stage:<20} {rows:>10,} rows  {seconds:>8.3f}s  {peak / 1e6:>9.1f} MB peak")
+    return result, record
+
+def run(rows):
+    df = make_feature_set_rows(rows)
+    n = len(df)
+    records = []
+
+    def stage(name, func, *args):
+        result, record = measure(name, n, func, *args)
+        records.append(record)
+        return result
+
+    stage('summarize_dataframe', summarize_dataframe, df)
+    filtered = stage('select_by_date', select_by_date, df, '2021-01', '2024-11')
+    filtered = stage('clip_sets', clip_sets, filtered)
+    filtered = filtered.loc[filtered.price > 0]
+    agg_set = stage('agg_by_set', agg_by_set, filtered)
+    stage('agg_by_release', agg_by_release, filtered)
+    stage('release_cube', ReleaseCube.from_frame, filtered, SET_METRIC_COLS)
+    stage('compute_movers', compute_movers, df)
+    stage('card_features', card_features, df)
+
+    plotter = Plotter(title="", xlabel="date (monthly)", ylabel="price (USD)")
+    Plotter._render_cache.clear()
+    stage('render_basic', plotter.render_basic, agg_set, 'date', 'top10_nm_card_mo_sum_in_set', "line", "set_name")
+    stage('render_basic_cached', plotter.render_basic, agg_set, 'date', 'top10_nm_card_mo_sum_in_set', "line", "set_name")
+    return records
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[100_000, 1_000_000, 10_000_000])
+    parser.add_argument('--json', help="also write the records to this file")
+    args = parser.parse_args()
+
+    records = []
+    for rows in args.rows:
+        records.extend(run(rows))
+        print()
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(records, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
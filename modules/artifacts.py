@@ -0,0 +1,66 @@
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+import pandas as pd
+
+
+# versioned outputs of the precompute job (modules.pipeline), one directory per run:
+#   <ARTIFACT_DIR>/<version>/<name>.parquet + manifest.json, and LATEST naming the newest complete run
+ARTIFACT_DIR = Path(os.getenv("ARTIFACT_DIR", Path(__file__).parent.parent / "data" / "artifacts"))
+
+
+def write_artifacts(frames, values=None, store=ARTIFACT_DIR, keep=5):
+    """
+    Writes a run's frames as parquet plus a manifest.json (with `values`, any json-able extras such as row counts
+    or set lists), then points LATEST at it. The run is written to a temp directory and renamed into place, so
+    readers never see half a run. Only the newest `keep` runs are kept.
+
+    Returns:
+        the new version (a UTC timestamp, e.g. 20241130T021500Z).
+    """
+    store = Path(store)
+    store.mkdir(parents=True, exist_ok=True)
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    # two runs within a second get a suffix
+    suffix = 1
+    while (store / version).exists():
+        version = f"{version.split('-')[0]}-{suffix}"
+        suffix += 1
+    tmp_dir = store / f".{version}.{os.getpid()}.tmp"
+    tmp_dir.mkdir()
+
+    manifest = {'version': version, 'created_at': datetime.now(timezone.utc).isoformat(), 'artifacts': {}, 'values': values or {}}
+    for name, frame in frames.items():
+        path = tmp_dir / f"{name}.parquet"
+        frame.to_parquet(path, index=False)
+        manifest['artifacts'][name] = {'file': path.name, 'rows': len(frame), 'columns': list(map(str, frame.columns))}
+    with open(tmp_dir / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2, default=str)
+
+    os.replace(tmp_dir, store / version)
+    latest_tmp = store / f"LATEST.{os.getpid()}.tmp"
+    latest_tmp.write_text(version)
+    os.replace(latest_tmp, store / "LATEST")
+
+    for old in sorted(path for path in store.iterdir() if path.is_dir() and not path.name.startswith("."))[:-keep]:
+        shutil.rmtree(old, ignore_errors=True)
+    print(f"write_artifacts(): wrote {len(frames)} artifacts to {store / version}")
+    return version
+
+def latest_version(store=ARTIFACT_DIR):
+    # newest complete run, None before the first one
+    path = Path(store) / "LATEST"
+    return path.read_text().strip() if path.exists() else None
+
+def read_manifest(version=None, store=ARTIFACT_DIR):
+    version = version or latest_version(store)
+    if version is None:
+        raise FileNotFoundError(f"No precomputed artifacts in {store}, run python -m modules.pipeline first")
+    with open(Path(store) / version / "manifest.json") as f:
+        return json.load(f)
+
+def read_artifact(name, version=None, store=ARTIFACT_DIR):
+    manifest = read_manifest(version, store)
+    return pd.read_parquet(Path(store) / manifest['version'] / manifest['artifacts'][name]['file'])
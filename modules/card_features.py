@@ -0,0 +1,137 @@
+import pandas as pd
+import numpy as np
+from modules.movers import ATTRIBUTE_COLS, series_keys
+
+
+# Per card time series features over the (poke_id, grade) price panel, for the dashboard and the price model's
+# training set. The panel is sorted once so every series is a contiguous date-sorted segment, then each feature
+# is a few array passes over all series at once (no per series groupby/rolling).
+
+def _segment_cummax(values, keys):
+    """
+    Running max of values within each segment of (sorted) keys. Values are replaced by their exact dense ranks
+    and offset by segment, so one np.maximum.accumulate restarts at every segment boundary. NaN counts as lowest.
+    """
+    values = np.where(np.isnan(values), -np.inf, values)
+    uniques, ranks = np.unique(values, return_inverse=True)
+    offset = keys.astype(np.int64) * len(uniques)
+    return uniques[np.maximum.accumulate(offset + ranks) - offset]
+
+def _window_sums(values, valid, starts, keys, window):
+    # sum and count of the valid values over each row's last `window` rows, clipped to its segment
+    n = len(values)
+    prefix = np.concatenate([[0], np.cumsum(np.where(valid, values, 0))])
+    prefix_count = np.concatenate([[0], np.cumsum(valid)])
+    lo = np.maximum(np.arange(n) - window + 1, starts[keys])
+    hi = np.arange(n) + 1
+    return prefix[hi] - prefix[lo], prefix_count[hi] - prefix_count[lo]
+
+def _panel(df, window):
+    """
+    Sorts the panel by series then date and computes every feature per row.
+
+    Returns:
+        (order, keys, ends, features): df positions in sorted order (rows without a series left out), each sorted row's series number, the end
+        of each series' segment and a dict of feature arrays aligned with the sorted rows.
+    """
+    rows, keys = series_keys(df)
+    dates = df['date'].to_numpy()[rows]
+    sorted_rows = np.lexsort((dates, keys))
+    order = rows[sorted_rows]
+    keys = keys[sorted_rows]
+    dates = dates[sorted_rows]
+    prices = df['price'].to_numpy(dtype='float64')[order]
+    # unpriced months (0) aren't prices, they'd make infinite returns and fake drawdowns
+    prices[prices <= 0] = np.nan
+
+    counts = np.bincount(keys)
+    ends = np.cumsum(counts)
+    starts = ends - counts
+    position = np.arange(len(keys)) - starts[keys]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # returns between consecutive rows (monthly), and over the last `window` rows
+        ret_1m = np.full(len(prices), np.nan)
+        ret_1m[1:] = prices[1:] / prices[:-1] - 1
+        ret_1m[position < 1] = np.nan
+        ret_window = np.full(len(prices), np.nan)
+        ret_window[window:] = prices[window:] / prices[:-window] - 1
+        ret_window[position < window] = np.nan
+
+        # volatility: sample std of the monthly returns in the window, from prefix sums of r and r^2
+        valid = np.isfinite(ret_1m)
+        sums, n = _window_sums(ret_1m, valid, starts, keys, window)
+        sums_sq, _ = _window_sums(ret_1m ** 2, valid, starts, keys, window)
+        variance = np.maximum(sums_sq - sums ** 2 / n, 0) / (n - 1)
+        volatility = np.where(n >= 2, np.sqrt(variance), np.nan)
+
+        # drawdown from the running peak, and the deepest one so far
+        peak = _segment_cummax(prices, keys)
+        peak[np.isinf(peak)] = np.nan
+        drawdown = prices / peak - 1
+        max_drawdown = -_segment_cummax(-drawdown, keys)
+        max_drawdown[np.isinf(max_drawdown)] = np.nan
+
+    # months since the latest row at the running peak (the first row of a segment always is one, so the running
+    # max of peak positions never crosses into the previous series)
+    at_peak = (prices == peak) | (position == 0)
+    peak_position = np.maximum.accumulate(np.where(at_peak, np.arange(len(prices)), 0))
+    months = dates.astype('datetime64[M]').astype(np.int64)
+    months_since_peak = months - months[peak_position]
+
+    features = {
+        'ret_1m': ret_1m,
+        f'ret_{window}m': ret_window,
+        f'vol_{window}m': volatility,
+        'drawdown': drawdown,
+        'max_drawdown': max_drawdown,
+        'months_since_peak': months_since_peak,
+        'peak_price': peak,
+    }
+    return order, keys, ends, features
+
+def rolling_features(df, window=6):
+    """
+    Row level features for every price point of every (poke_id, grade) series, e.g. for the model's training set.
+    Returns are taken between consecutive rows of a series (feature_set has one row per month), so a gap in a
+    series' months is folded into the next return. Unpriced (0 or missing) rows have no return or drawdown and
+    don't count towards the volatility or peak.
+
+    Args:
+        df: feature_set rows with at least date, poke_id, grade and price.
+        window: rows (months) of the trailing return and volatility, default is 6.
+
+    Returns:
+        DataFrame aligned with df's index: ret_1m, ret_{window}m, vol_{window}m, drawdown (from the running
+        peak), max_drawdown (so far), months_since_peak and peak_price, as float32 (months_since_peak int16).
+    """
+    order, _, _, features = _panel(df, window)
+    out = {}
+    for name, values in features.items():
+        # rows without a series (null poke_id or grade) get NaN, or -1 months since peak
+        column = np.full(len(df), -1 if name == 'months_since_peak' else np.nan, dtype=values.dtype)
+        column[order] = values
+        out[name] = column.astype(np.int16 if name == 'months_since_peak' else np.float32)
+    return pd.DataFrame(out, index=df.index)
+
+def card_features(df, window=6):
+    """
+    One row per (poke_id, grade) with its latest features, a compact table for the dashboard.
+
+    Returns:
+        DataFrame with poke_id, grade, the attribute columns of its latest row, n_months, last_price and the
+        rolling_features of its latest row (max_drawdown over the whole series).
+    """
+    columns = ['poke_id', 'grade'] + [col for col in ATTRIBUTE_COLS if col in df.columns]
+    if len(series_keys(df)[1]) == 0:
+        return pd.DataFrame(columns=columns + ['n_months', 'last_price', 'ret_1m', f'ret_{window}m', f'vol_{window}m',
+                                              'drawdown', 'max_drawdown', 'months_since_peak', 'peak_price'])
+    order, keys, ends, features = _panel(df, window)
+    last = ends - 1
+
+    cards = df.iloc[order[last]][columns].reset_index(drop=True)
+    cards['n_months'] = np.diff(np.concatenate([[0], ends])).astype(np.int32)
+    cards['last_price'] = df['price'].to_numpy(dtype='float64')[order[last]].astype(np.float32)
+    for name, values in features.items():
+        cards[name] = values[last].astype(np.int16 if name == 'months_since_peak' else np.float32)
+    return cards
@@ -0,0 +1,173 @@
+import os
+import numpy as np
+import pandas as pd
+from modules.instrument import stage
+
+
+# "vega" renders the line charts in the browser (vega-lite) instead of as matplotlib images on the server
+CHART_BACKEND = os.getenv("CHART_BACKEND", "matplotlib")
+# per series points sent to the browser, longer series are downsampled
+MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", 500))
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling: indices of n_out points of (x, y) that keep the visual shape
+    of the line. The first and last points are always kept.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # n_out - 2 buckets between the first and last point, the last point is a bucket of its own
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(np.int64), n)
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0], selected[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        next_start, next_end = edges[i + 1], edges[i + 2]
+        avg_x, avg_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        # twice the area of the triangle (last selected point, candidate, next bucket's average)
+        area = np.abs((x[a] - avg_x) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (avg_y - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def minmax_decimate(x, y, n_out):
+    """
+    Min/max decimation: the lowest and highest point of each of (n_out - 2) // 2 buckets, plus the first and
+    last point (at most n_out points), so spikes survive. Cheaper than lttb, fully vectorized.
+    """
+    n = len(y)
+    if n_out >= n or n_out < 4:
+        return np.arange(n)
+    y = np.asarray(y, dtype=np.float64)
+    starts = np.linspace(0, n, (n_out - 2) // 2, endpoint=False).astype(np.int64)
+    bucket = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, n)))
+    # position of each bucket's min/max: sort by (bucket, y) and take both ends of every bucket
+    order = np.lexsort((y, bucket))
+    ends = np.append(starts[1:], n) - 1
+    selected = np.concatenate([[0, n - 1], order[starts], order[ends]])
+    return np.unique(selected)
+
+DOWNSAMPLERS = {'lttb': lttb, 'minmax': minmax_decimate}
+
+def downsample(data, x, y, hue=None, max_points=MAX_POINTS, method='lttb'):
+    """
+    Keeps at most max_points rows of each hue series (sorted by x), chosen by DOWNSAMPLERS[method]. Series
+    already under the limit pass through whole.
+    """
+    data = data[[col for col in (x, y, hue) if col is not None]].dropna(subset=[x, y])
+    if hue is None:
+        groups = [data]
+    else:
+        groups = [group for _, group in data.groupby(hue, observed=True, sort=False)]
+
+    kept = []
+    for group in groups:
+        group = group.sort_values(x)
+        if len(group) > max_points:
+            xs = group[x].to_numpy()
+            xs = xs.astype('datetime64[ns]').astype(np.int64) if np.issubdtype(xs.dtype, np.datetime64) else xs
+            group = group.iloc[DOWNSAMPLERS[method](xs, group[y].to_numpy(), max_points)]
+        kept.append(group)
+    return pd.concat(kept, ignore_index=True) if kept else data
+
+
+class ClientPlotter:
+    """
+    Same call surface as viz.Plotter (plot_basic / render_basic / render_many / show), but a chart is the
+    downsampled plotted columns plus a vega-lite spec, drawn by the browser with hover and zoom. Nothing is
+    rendered on the server and reruns only resend the (arrow serialized) columns.
+    """
+
+    def __init__(self, figsize=(15, 8), style="whitegrid", title="Plot", xlabel="X-axis", ylabel="Y-axis",
+                 max_points=MAX_POINTS, method='lttb'):
+        # figsize/style are kept for parity with Plotter, the browser sizes the chart to the page
+        self.figsize = figsize
+        self.style = style
+        self.title = title
+        self.xlabel = xlabel
+        self.ylabel = ylabel
+        self.max_points = max_points
+        self.method = method
+
+    def settings(self):
+        return {'figsize': self.figsize, 'style': self.style, 'title': self.title, 'xlabel': self.xlabel, 'ylabel': self.ylabel,
+                'max_points': self.max_points, 'method': self.method}
+
+    def plot_basic(self, data, x, y, kind="line", hue=None, marker=""):
+        """
+        Builds a client side chart of the given data and plot type.
+
+        Args:
+            data: DataFrame to plot.
+            x: Column name for the x-axis.
+            y: Column name for the y-axis.
+            kind: "line", "scatter" or "bar", default is "line".
+            hue: optional column with one series (color) per value.
+
+        Returns:
+            {'data': downsampled plotted columns, 'spec': vega-lite spec}, see show().
+        """
+        if kind in ("line", "scatter"):
+            data = downsample(data, x, y, hue, self.max_points, self.method)
+        else:
+            data = data[[col for col in (x, y, hue) if col is not None]]
+        if hue is not None and isinstance(data[hue].dtype, pd.CategoricalDtype):
+            data = data.assign(**{hue: data[hue].cat.remove_unused_categories()})
+
+        x_type = "temporal" if pd.api.types.is_datetime64_any_dtype(data[x]) else "quantitative" if pd.api.types.is_numeric_dtype(data[x]) else "nominal"
+        encoding = {
+            'x': {'field': x, 'type': x_type, 'title': self.xlabel},
+            'y': {'field': y, 'type': 'quantitative', 'title': self.ylabel},
+            'tooltip': [{'field': col, 'type': x_type if col == x else 'quantitative' if col == y else 'nominal'}
+                        for col in (hue, x, y) if col is not None],
+        }
+        if hue is not None:
+            encoding['color'] = {'field': hue, 'type': 'nominal', 'legend': {'orient': 'right'}}
+
+        mark = {'line': {'type': 'line', 'point': bool(marker)}, 'scatter': {'type': 'point'}, 'bar': {'type': 'bar'}}[kind]
+        spec = {
+            'mark': {**mark, 'tooltip': True},
+            'encoding': encoding,
+            # drag to pan, scroll to zoom
+            'params': [{'name': 'zoom', 'select': 'interval', 'bind': 'scales'}],
+            'width': 'container',
+            'height': 400,
+        }
+        if self.title:
+            spec['title'] = self.title
+        return {'data': data, 'spec': spec}
+
+    def render_basic(self, data, x, y, kind="line", hue=None, marker="", format=None):
+        with stage(f"chart: {y}", rows_in=len(data)) as info:
+            chart = self.plot_basic(data, x, y, kind=kind, hue=hue, marker=marker)
+            info['rows_out'] = len(chart['data'])
+        return chart
+
+    def render_many(self, specs, max_workers=None):
+        # nothing to parallelize, each chart is just a downsample
+        charts = []
+        for i, spec in enumerate(specs):
+            spec = dict(spec)
+            spec.pop('format', None)
+            settings = self.settings()
+            settings.update({name: spec.pop(name) for name in ('title', 'xlabel', 'ylabel') if name in spec})
+            with stage(f"chart {i}: {spec['y']}", rows_in=len(spec['data'])) as info:
+                charts.append(ClientPlotter(**settings).plot_basic(**spec))
+                info['rows_out'] = len(charts[-1]['data'])
+        return charts
+
+    @staticmethod
+    def show(container, chart):
+        container.vega_lite_chart(chart['data'], chart['spec'])
+
+def make_plotter(**settings):
+    # the line chart plotter for the configured CHART_BACKEND
+    if CHART_BACKEND == "vega":
+        return ClientPlotter(**settings)
+    from modules.viz import Plotter
+    return Plotter(**settings)
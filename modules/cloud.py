@@ -1,56 +1,272 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import create_engine
 import os
-from dotenv import load_dotenv
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from modules.loader import read_sql_compact, sql_identifier
+from modules.processing import shared_view
+from modules.refresh import VersionedCache
+from modules.rollup import PSA_WATERMARK_COLUMN, card_type_counts, read_rollup, update_rollup
+from modules.snapshot import read_snapshot, refresh_snapshot, sync_snapshot
 
 
-db_host = os.getenv('DB_HOST')
-db_user = os.getenv('DB_USER')
-db_password = os.getenv('DB_PASSWORD')
-db_name = os.getenv('DB_NAME')
+def database_url():
+    """
+    DATABASE_URL overrides the RDS settings, e.g. sqlite:///local.db or a local postgres for testing. Otherwise
+    the RDS settings come from env vars, then .env, then st.secrets when deployed.
+    """
+    database_url = os.getenv('DATABASE_URL')
+    if database_url is not None:
+        return database_url
 
-
-# If the environment variables are not set (e.g., not in Docker), load them from .env
-if db_host is None or db_user is None or db_password is None or db_name is None:
-    print("Environment variables not set, attempting to load from .env file...")
-    load_dotenv(".env")  # load the .env file
     db_host = os.getenv('DB_HOST')
     db_user = os.getenv('DB_USER')
     db_password = os.getenv('DB_PASSWORD')
     db_name = os.getenv('DB_NAME')
-    
-# If no env vars still, we are deployed and live
-if db_host is None or db_user is None or db_password is None or db_name is None:
-    print("getting st env vars")
-    db_host = st.secrets["DB_HOST"]
-    db_user = st.secrets["DB_USER"]
-    db_password = st.secrets["DB_PASSWORD"]
-    db_name = st.secrets["DB_NAME"]
-
-connection_string = f'postgresql://{db_user}:{db_password}@{db_host}:5432/{db_name}'
-engine = create_engine(connection_string)
-
-@st.cache_data
-def query_feature_set(limit=10000):
+
+    # If the environment variables are not set (e.g., not in Docker), load them from .env
+    if db_host is None or db_user is None or db_password is None or db_name is None:
+        print("Environment variables not set, attempting to load from .env file...")
+        from dotenv import load_dotenv
+        load_dotenv(".env")  # load the .env file
+        db_host = os.getenv('DB_HOST')
+        db_user = os.getenv('DB_USER')
+        db_password = os.getenv('DB_PASSWORD')
+        db_name = os.getenv('DB_NAME')
+
+    # If no env vars still, we are deployed and live
+    if db_host is None or db_user is None or db_password is None or db_name is None:
+        print("getting st env vars")
+        db_host = st.secrets["DB_HOST"]
+        db_user = st.secrets["DB_USER"]
+        db_password = st.secrets["DB_PASSWORD"]
+        db_name = st.secrets["DB_NAME"]
+
+    return f'postgresql://{db_user}:{db_password}@{db_host}:5432/{db_name}'
+
+# pool settings, sized for the handful of concurrent queries a session runs
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 5))
+MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 5))
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # seconds, below RDS/proxy idle timeouts
+POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+
+def make_engine(url):
+    """
+    Creates the engine with an explicitly sized pool. Connections are pre-pinged on checkout, so a connection
+    the database dropped while idle is replaced instead of failing the query, and recycled after POOL_RECYCLE.
+    """
+    from sqlalchemy import create_engine
+    kwargs = {'pool_pre_ping': True, 'pool_recycle': POOL_RECYCLE}
+    # sqlite uses its own single-file/singleton pools, which don't take sizing arguments
+    if not url.startswith('sqlite'):
+        kwargs.update(pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW, pool_timeout=POOL_TIMEOUT)
+    return create_engine(url, **kwargs)
+
+# created by the first query rather than on import, so pages render before sqlalchemy loads and secrets are read
+_engine = None
+_engine_lock = threading.Lock()
+
+def get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            _engine = make_engine(database_url())
+        return _engine
+
+# runs independent queries side by side, no more threads than pooled connections
+_query_executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="query")
+
+def submit_query(func, *args, **kwargs):
+    """
+    Runs func(*args, **kwargs) on the query thread pool and returns a Future, so independent queries overlap
+    and the page only blocks (future.result()) where it needs the data.
+
+    The caller's streamlit script context is attached to the worker thread, so cached queries and st.error
+    behave as if called from the script.
+    """
+    ctx = get_script_run_ctx()
+
+    def run():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+        return func(*args, **kwargs)
+
+    return _query_executor.submit(run)
+
+# how often the data version is probed (seconds); cached frames are reloaded in the background when it moves on
+DATA_VERSION_TTL = int(os.getenv('DATA_VERSION_TTL', 300))
+
+def probe_data_version():
+    """
+    Cheap version of the data: max(date) and row count of feature_set, row count (and max watermark) of
+    psa_data. Changes after every scraper run.
+    """
+    from sqlalchemy import text
+    psa_max = f"MAX({sql_identifier(PSA_WATERMARK_COLUMN)})" if PSA_WATERMARK_COLUMN else "NULL"
+    with get_engine().connect() as conn:
+        features = conn.execute(text("SELECT MAX(date), COUNT(*) FROM feature_set")).one()
+        psa = conn.execute(text(f"SELECT {psa_max}, COUNT(*) FROM psa_data")).one()
+    return tuple(str(value) for value in (*features, *psa))
+
+# The query results are loaded once per process (per query) and shared by every session and rerun as is, rather
+# than pickled into the data cache and deserialized into a fresh copy on each call. Callers get a
+# processing.shared_view, so nothing they do reaches the shared frame. Concurrent misses make one query, and
+# after a scraper run the cache reloads in the background while the previous data is served. Failures raise,
+# so they aren't cached.
+_data_cache = VersionedCache(probe_data_version, ttl=DATA_VERSION_TTL, max_entries=16)
+
+def data_version():
+    # version of the data the query functions serve, to key caches of anything computed from them
+    return _data_cache.version()
+
+def _load_feature_set(limit, use_snapshot):
+    try:
+        if use_snapshot:
+            # incremental: only rows newer than the local snapshot's date watermark come over the wire
+            return refresh_snapshot(get_engine()).head(limit)
+        query = "SELECT * FROM feature_set LIMIT :limit"
+        return read_sql_compact(query, get_engine(), params={'limit': limit})
+    except Exception as e:
+        # db unreachable, serve the (possibly stale) local snapshot if we have one
+        data = read_snapshot() if use_snapshot else None
+        if data is None:
+            raise
+        print(f"query_feature_set(): refresh failed ({e}), serving local snapshot")
+        return data.head(limit)
+
+def query_feature_set(limit=10000, use_snapshot=True):
+    try:
+        data = _data_cache.get(('feature_set', limit, use_snapshot), lambda: _load_feature_set(limit, use_snapshot))
+        return shared_view(data)
+    except Exception as e:
+        st.error(f"Error: {e}")
+        return None
+
+SQL_OPS = {'==': '=', '!=': '<>', '>': '>', '>=': '>=', '<': '<', '<=': '<=', 'in': 'IN', 'not in': 'NOT IN'}
+
+def feature_filters(start=None, end=None, clip_months=None, price_above=None, grades=None, product_types=None,
+                    exclude_product_types=None, poke_names=None):
+    """
+    Builds (column, op, value) predicates for feature_set. The same list compiles to SQL (build_feature_query)
+    or is handed to pyarrow as parquet filters when reading the local snapshot.
+
+    Args:
+        start, end: yyyy-mm or yyyy-mm-dd, inclusive (same semantics as processing.select_by_date).
+        clip_months: keep rows with mos_since_release > clip_months (processing.clip_sets uses 2).
+        price_above: keep rows with price > price_above.
+        grades, product_types, poke_names: keep rows whose value is in the list.
+        exclude_product_types: drop rows whose product_type is in the list.
+    """
+    filters = []
+    if start is not None:
+        filters.append(('date', '>=', pd.Timestamp(start)))
+    if end is not None:
+        filters.append(('date', '<=', pd.Timestamp(end)))
+    if clip_months is not None:
+        filters.append(('mos_since_release', '>', clip_months))
+    if price_above is not None:
+        filters.append(('price', '>', price_above))
+    if grades:
+        filters.append(('grade', 'in', list(grades)))
+    if product_types:
+        filters.append(('product_type', 'in', list(product_types)))
+    if exclude_product_types:
+        filters.append(('product_type', 'not in', list(exclude_product_types)))
+    if poke_names:
+        filters.append(('poke_name', 'in', list(poke_names)))
+    return filters
+
+def _sql_value(value):
+    # timestamps go over as untyped iso literals, which postgres compares against text, date or timestamp columns
+    return value.strftime('%Y-%m-%d') if isinstance(value, pd.Timestamp) else value
+
+def build_feature_query(columns=None, filters=(), limit=None):
+    """
+    Compiles a column projection and feature_filters() predicates into a parameterized feature_set query.
+
+    Returns:
+        (query, params) to pass to pd.read_sql / read_sql_compact.
+    """
+    select = ", ".join(sql_identifier(col) for col in columns) if columns else "*"
+    query = f"SELECT {select} FROM feature_set"
+
+    clauses, params = [], {}
+    for column, op, value in filters:
+        if op not in SQL_OPS:
+            raise ValueError(f"Unsupported operator: {op!r}")
+        # named binds (:p0, :p1_0, ...) so the same query runs on postgres and sqlite
+        name = f"p{len(clauses)}"
+        if op in ('in', 'not in'):
+            names = [f"{name}_{j}" for j in range(len(value))]
+            clauses.append(f"{sql_identifier(column)} {SQL_OPS[op]} ({', '.join(':' + n for n in names)})")
+            params.update({n: _sql_value(v) for n, v in zip(names, value)})
+        else:
+            clauses.append(f"{sql_identifier(column)} {SQL_OPS[op]} :{name}")
+            params[name] = _sql_value(value)
+
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    if limit is not None:
+        query += " LIMIT :limit"
+        params['limit'] = limit
+    return query, params
+
+def _load_features(columns, filters, limit, use_snapshot):
+    if use_snapshot:
+        try:
+            sync_snapshot(get_engine())
+        except Exception as e:
+            # db unreachable, serve the (possibly stale) local snapshot if we have one
+            print(f"query_features(): snapshot sync failed ({e}), serving local snapshot")
+        data = read_snapshot(columns=columns, filters=filters)
+        if data is None:
+            raise RuntimeError("feature_set is unreachable and there's no local snapshot")
+        data = data if limit is None else data.head(limit)
+    else:
+        query, params = build_feature_query(columns, filters, limit)
+        data = read_sql_compact(query, get_engine(), params=params)
+    if "Unnamed: 0" in data.columns:
+        data = data.drop(columns=["Unnamed: 0"])
+    return data
+
+def query_features(columns=None, filters=(), limit=None, use_snapshot=True):
+    """
+    Returns only the rows/columns a view needs, filtering in postgres (or in the parquet scan when serving
+    from the local snapshot) instead of loading SELECT * and filtering in pandas. The frame is a shared_view
+    of one per process frame.
+    """
     try:
-        query = "SELECT * FROM feature_set LIMIT %s"
-        data = pd.read_sql(query, engine, params=(limit,))
-        return data
+        key = ('features', repr(columns), repr(filters), limit, use_snapshot)
+        return shared_view(_data_cache.get(key, lambda: _load_features(columns, filters, limit, use_snapshot)))
     except Exception as e:
         st.error(f"Error: {e}")
         return None
 
-@st.cache_data
-def query_all_card_types(limit=10000):
+def _load_card_type_rollup():
     try:
-        query = """
-        SELECT card_type, COUNT(*) as count
-        FROM psa_data
-        GROUP BY card_type
-        HAVING COUNT(*) >= 50 LIMIT %s"""
-        data = pd.read_sql(query, engine, params=(limit,))
-        return data
+        # only psa_data rows past the rollup's watermark are counted
+        return update_rollup(get_engine())
+    except Exception as e:
+        # db unreachable, serve the (possibly stale) local rollup if we have one
+        rollup, _ = read_rollup()
+        if rollup is None:
+            raise
+        print(f"query_all_card_types(): rollup update failed ({e}), serving local rollup")
+        return rollup
+
+def query_all_card_types(limit=10000, by=()):
+    """
+    Card types with 50+ psa_data rows and their counts, fewest first, from the incrementally maintained rollup
+    (modules.rollup) rather than a GROUP BY over psa_data.
+
+    Args:
+        by: breakdown columns, e.g. ['grade'] or ['set_name'] for counts per card type and grade/set.
+    """
+    try:
+        rollup = _data_cache.get(('card_type_rollup',), _load_card_type_rollup)
+        # the most common ones when over the limit
+        return card_type_counts(rollup, by=by).tail(limit).reset_index(drop=True)
     except Exception as e:
         st.error(f"Error: {e}")
-        return None
\ No newline at end of file
+        return None
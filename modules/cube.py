@@ -0,0 +1,127 @@
+import pandas as pd
+import numpy as np
+
+
+class ReleaseCube:
+    """
+    Dense set x months-since-release x metric array of monthly means, for comparing sets at the same age
+    (e.g. month 12 across all sets) without pivoting frames.
+
+        cube = ReleaseCube.from_frame(df, metrics=SET_METRIC_COLS)
+        cube.curve('evolving-skies', 'bb_mo_price_by_set')       # one set's release curve
+        cube.at_month(12, 'bb_mo_price_by_set')                   # every set at month 12, aligned with cube.sets
+
+    Months a set has no data for are NaN.
+    """
+
+    def __init__(self, values, sets, metrics, months=None):
+        self.values = values
+        self.sets = pd.Index(sets)
+        self.metrics = list(metrics)
+        self.months = np.arange(values.shape[1]) if months is None else np.asarray(months)
+        self._set_pos = {name: i for i, name in enumerate(self.sets)}
+        self._metric_pos = {name: i for i, name in enumerate(self.metrics)}
+
+    @classmethod
+    def from_frame(cls, df, metrics, key='set_name', month_col='mos_since_release', dtype=np.float32):
+        """
+        Builds the cube in one pass: every row maps to a flat (set, month) cell and each metric is averaged
+        with np.bincount over those cells. Rows before release (negative months) are left out.
+
+        Args:
+            metrics: metric columns, in the order of the cube's last axis.
+            dtype: dtype of the cube, sums are accumulated in float64 either way.
+        """
+        keys = df[key]
+        if isinstance(keys.dtype, pd.CategoricalDtype):
+            codes, uniques = keys.cat.codes.to_numpy(), keys.cat.categories
+        else:
+            codes, uniques = pd.factorize(keys, sort=True)
+        months = df[month_col].to_numpy()
+
+        valid = (codes >= 0) & (months >= 0)
+        codes, months = codes[valid], months[valid].astype(np.int64)
+
+        # only sets with rows get a slot, in category (or sorted) order like groupby(observed=True)
+        present = np.flatnonzero(np.bincount(codes, minlength=len(uniques)))
+        slot = np.full(len(uniques), -1, dtype=np.int64)
+        slot[present] = np.arange(len(present))
+        n_sets = len(present)
+        n_months = int(months.max()) + 1 if len(months) else 0
+
+        cells = slot[codes] * n_months + months
+        values = np.full((n_sets, n_months, len(metrics)), np.nan, dtype=dtype)
+        for i, metric in enumerate(metrics):
+            column = df[metric].to_numpy()[valid]
+            notnull = ~np.isnan(column)
+            sums = np.bincount(cells[notnull], weights=column[notnull], minlength=n_sets * n_months)
+            counts = np.bincount(cells[notnull], minlength=n_sets * n_months)
+            with np.errstate(invalid='ignore'):
+                values[:, :, i] = (sums / counts).reshape(n_sets, n_months)
+
+        return cls(values, uniques[present], metrics)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def set_index(self, name):
+        return self._set_pos[name]
+
+    def metric_index(self, name):
+        return self._metric_pos[name]
+
+    def curve(self, set_name, metric):
+        # one set's monthly values since release (a view)
+        return self.values[self.set_index(set_name), :, self.metric_index(metric)]
+
+    def at_month(self, month, metric):
+        # every set's value at one month since release, aligned with self.sets (a view)
+        return self.values[:, month, self.metric_index(metric)]
+
+    def select(self, sets=None, months=None, metrics=None):
+        """
+        Sub-cube over the given set/metric labels and months (a slice or list of month numbers). Slices of
+        months stay views, label lists are gathered.
+        """
+        set_pos = slice(None) if sets is None else [self.set_index(name) for name in sets]
+        metric_pos = slice(None) if metrics is None else [self.metric_index(name) for name in metrics]
+        month_pos = slice(None) if months is None else months
+
+        values = self.values[set_pos]
+        values = values[:, month_pos]
+        values = values[:, :, metric_pos]
+        return ReleaseCube(
+            values,
+            self.sets if sets is None else sets,
+            self.metrics if metrics is None else metrics,
+            self.months[month_pos],
+        )
+
+    def to_frame(self, prefix='avg_price_'):
+        """
+        Wide frame with one row per month since release and one column per (metric, set), named like
+        agg_by_release's columns.
+        """
+        n_sets, n_months, n_metrics = self.values.shape
+        # metric major column order, like unstacking set_name under each metric
+        wide = self.values.transpose(1, 2, 0).reshape(n_months, n_metrics * n_sets)
+        columns = [f"{prefix}{(metric, set_name)}" for metric in self.metrics for set_name in self.sets]
+        frame = pd.DataFrame(wide, columns=columns)
+        frame.insert(0, 'mos_since_release', self.months)
+        return frame
+
+    def to_long(self, key='set_name', month_col='mos_since_release'):
+        """
+        Long frame with one row per (set, month) that has any value, the inverse of from_frame (for storing the
+        cube as a table).
+        """
+        set_pos, month_pos = np.nonzero(~np.isnan(self.values).all(axis=2))
+        frame = pd.DataFrame({
+            key: pd.Categorical.from_codes(set_pos, categories=self.sets),
+            month_col: self.months[month_pos],
+        })
+        for i, metric in enumerate(self.metrics):
+            frame[metric] = self.values[set_pos, month_pos, i]
+        return frame
+
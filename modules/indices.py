@@ -0,0 +1,201 @@
+import pandas as pd
+import numpy as np
+import re
+import threading
+
+
+# broad market indices over card price series, e.g. "2021 sets", "charizard", "alt arts"
+#   flags: cards with any of these is_* flags
+#   set_years: cards from sets released in these years
+#   names: cards whose name has one of these hyphenated tokens (e.g. charizard matches charizard-ex)
+#   grade: the grade priced, default nearmint
+#   weighting: 'equal', 'price' (last month's price) or 'cap' (last month's price x weight_col)
+MAJOR_INDICES = {
+    'illustration rares': {'flags': ['is_ir', 'is_sir'], 'weighting': 'price'},
+    'gallery': {'flags': ['is_gallery']},
+    'full arts': {'flags': ['is_full_art', 'is_full_art_secret']},
+    'legendaries': {'flags': ['is_legendary']},
+    'og characters': {'flags': ['is_og_char'], 'weighting': 'price'},
+    'eeveelutions': {'flags': ['is_eeveelution']},
+    'charizard': {'names': ['charizard'], 'weighting': 'price'},
+    'charizard psa 10': {'names': ['charizard'], 'grade': 'psa_10', 'weighting': 'price'},
+    '2021 sets': {'set_years': [2021]},
+    '2023 sets': {'set_years': [2023]},
+}
+WEIGHTINGS = ('equal', 'price', 'cap')
+BASE_LEVEL = 100.0
+
+def index_columns(specs=MAJOR_INDICES):
+    # feature_set columns needed to compute the given indices
+    columns = ['date', 'poke_id', 'poke_name', 'grade', 'set_year', 'price']
+    for spec in specs.values():
+        columns += [col for col in spec.get('flags', []) + [spec.get('weight_col')] if col and col not in columns]
+    return columns
+
+def _members(spec, attrs):
+    # which series (rows of attrs) belong to the index
+    members = (attrs['grade'] == spec.get('grade', 'nearmint')).to_numpy(copy=True)
+    if spec.get('flags'):
+        members &= (attrs[spec['flags']].to_numpy() == 1).any(axis=1)
+    if spec.get('set_years'):
+        members &= attrs['set_year'].isin(spec['set_years']).to_numpy()
+    if spec.get('names'):
+        terms = "|".join(re.escape(name) for name in spec['names'])
+        members &= attrs['poke_name'].astype(str).str.contains(rf"(?:^|-)(?:{terms})(?:-|$)").to_numpy()
+    return members
+
+
+class MarketIndices:
+    """
+    Computes a set of declared indices (see MAJOR_INDICES) over the monthly card price panel.
+
+    Each index is chain linked from BASE_LEVEL: its monthly return is the weighted mean return of its member series
+    ((poke_id, grade)) priced in both months. All indices come out of one matrix product of a membership matrix
+    (indices x series) with the weighted returns (series x months), instead of filtering and re-averaging the frame
+    once per index.
+
+    New months are folded in with update(), which only touches the new rows; the level series are kept.
+
+        indices = MarketIndices(MAJOR_INDICES)
+        indices.update(df)                                     # full history
+        indices.update(df.loc[df.date >= indices.last_month])  # months since (and the last one again)
+        indices.levels()
+    """
+
+    def __init__(self, specs=MAJOR_INDICES):
+        for name, spec in specs.items():
+            if spec.get('weighting', 'equal') not in WEIGHTINGS:
+                raise ValueError(f"{name}: unsupported weighting {spec['weighting']!r}")
+            if spec.get('weighting') == 'cap' and not spec.get('weight_col'):
+                raise ValueError(f"{name}: cap weighting needs a weight_col")
+        self.specs = dict(specs)
+        self.names = list(self.specs)
+        self.last_month = None
+        self._lock = threading.Lock()
+        self._series = {}
+        self._membership = np.zeros((len(self.names), 0), dtype=np.float32)
+        # each series' price (and weight columns) in the last month computed, and the month before it
+        self._last = {col: np.zeros(0, dtype=np.float64) for col in ['price'] + self._weight_cols()}
+        self._prev = {col: np.zeros(0, dtype=np.float64) for col in self._last}
+        self._dates = []
+        self._levels = np.zeros((0, len(self.names)), dtype=np.float64)
+
+    def _weight_cols(self):
+        return sorted({spec['weight_col'] for spec in self.specs.values() if spec.get('weighting') == 'cap'})
+
+    def _register(self, df, keys):
+        # adds series seen for the first time, with their column of the membership matrix
+        new = [key for key in dict.fromkeys(keys) if key not in self._series]
+        if not new:
+            return
+        first_rows = df.drop_duplicates(['poke_id', 'grade']).set_index(['poke_id', 'grade']).loc[new].reset_index()
+        for key in new:
+            self._series[key] = len(self._series)
+        membership = np.stack([_members(self.specs[name], first_rows) for name in self.names]).astype(np.float32)
+        self._membership = np.hstack([self._membership, membership])
+        for state in (self._last, self._prev):
+            for col in state:
+                state[col] = np.concatenate([state[col], np.full(len(new), np.nan)])
+
+    def _rollback(self):
+        # drops the last computed month, so it can be folded in again with its late rows
+        self._levels = self._levels[:-1]
+        self._dates = self._dates[:-1]
+        self._last = self._prev
+        self._prev = {col: np.full(len(values), np.nan) for col, values in self._last.items()}
+        self.last_month = self._dates[-1] if self._dates else None
+
+    def update(self, df):
+        """
+        Folds in the months of df from last_month on and returns the levels. Rows of earlier months are ignored; the
+        last month is recomputed when df has rows for it, since it may have been partial (like the snapshot's
+        watermark month), so pass everything from last_month on.
+
+        Args:
+            df: feature_set rows with at least index_columns(specs).
+        """
+        with self._lock:
+            if df is None or len(df) == 0:
+                return self.levels()
+            dates = pd.to_datetime(df['date']).to_numpy().astype('datetime64[M]')
+            keep = df['grade'].isin({spec.get('grade', 'nearmint') for spec in self.specs.values()}).to_numpy(copy=True)
+            # rows without a poke_id aren't part of any series (same as movers.series_keys)
+            keep &= df['poke_id'].notna().to_numpy()
+            if self.last_month is not None:
+                keep &= dates >= np.datetime64(self.last_month, 'M')
+            df, dates = df.loc[keep], dates[keep]
+            if len(df) == 0:
+                return self.levels()
+            if self.last_month is not None and (dates == np.datetime64(self.last_month, 'M')).any():
+                self._rollback()
+
+            # rows -> distinct (poke_id, grade) pairs -> series positions, so the dict lookups are per series not per row
+            df = df.assign(grade=df['grade'].astype(str))
+            pair_codes = df.groupby(['poke_id', 'grade'], sort=False).ngroup().to_numpy()
+            pairs = df[['poke_id', 'grade']].to_numpy(dtype=object)[np.unique(pair_codes, return_index=True)[1]]
+            keys = [(int(poke_id), grade) for poke_id, grade in pairs]
+            self._register(df, keys)
+            series = np.array([self._series[key] for key in keys], dtype=np.int64)[pair_codes]
+
+            # price panel of the new months, series x months; unpriced (0) listings count as missing
+            month_dates, months = np.unique(dates, return_inverse=True)
+            month_dates = pd.DatetimeIndex(month_dates.astype('datetime64[ns]'))
+            n_series, n_months = len(self._series), len(month_dates)
+            prices = np.full((n_series, n_months), np.nan)
+            price = df['price'].to_numpy(dtype=np.float64)
+            prices[series, months] = np.where(price > 0, price, np.nan)
+            prices = np.hstack([self._last['price'][:, None], prices])
+
+            weights = {}
+            for col in self._weight_cols():
+                panel = np.full((n_series, n_months), np.nan)
+                panel[series, months] = df[col].to_numpy(dtype=np.float64)
+                weights[col] = np.hstack([self._last[col][:, None], panel])
+
+            # returns between consecutive months, only for series priced in both
+            with np.errstate(invalid='ignore', divide='ignore'):
+                returns = prices[:, 1:] / prices[:, :-1] - 1
+            priced = ~np.isnan(returns)
+            returns = np.where(priced, returns, 0)
+
+            index_returns = np.zeros((n_months, len(self.names)))
+            for weighting in WEIGHTINGS:
+                for weight_col in ([None] if weighting != 'cap' else self._weight_cols()):
+                    rows = [i for i, name in enumerate(self.names)
+                            if self.specs[name].get('weighting', 'equal') == weighting and self.specs[name].get('weight_col') == weight_col]
+                    if not rows:
+                        continue
+                    if weighting == 'equal':
+                        w = priced.astype(np.float64)
+                    else:
+                        w = np.where(priced, prices[:, :-1], 0)
+                        if weighting == 'cap':
+                            w = w * np.nan_to_num(weights[weight_col][:, :-1])
+                    membership = self._membership[rows].astype(np.float64)
+                    with np.errstate(invalid='ignore', divide='ignore'):
+                        r = (membership @ (w * returns)) / (membership @ w)
+                    # a month without priced members leaves the index flat
+                    index_returns[:, rows] = np.nan_to_num(r, nan=0.0).T
+
+            if len(self._levels) == 0:
+                # the first month is the base
+                index_returns[0] = 0
+                start = np.full(len(self.names), BASE_LEVEL)
+            else:
+                start = self._levels[-1]
+            levels = start * np.cumprod(1 + index_returns, axis=0)
+
+            self._levels = np.vstack([self._levels, levels])
+            self._dates += list(month_dates)
+            for col, panel in [('price', prices)] + list(weights.items()):
+                self._prev[col], self._last[col] = panel[:, -2], panel[:, -1]
+            self.last_month = month_dates[-1]
+            return self.levels()
+
+    def levels(self):
+        # index levels, one column per index, indexed by month
+        return pd.DataFrame(self._levels.copy(), index=pd.DatetimeIndex(self._dates, name='date'), columns=self.names)
+
+    def constituents(self, name):
+        # number of member series of an index
+        return int(self._membership[self.names.index(name)].sum())
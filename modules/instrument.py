@@ -0,0 +1,122 @@
+import streamlit as st
+import pandas as pd
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextlib import contextmanager
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+
+# stage records are structured json log lines, e.g. {"stage": "agg_by_set", "seconds": 0.41, "rows_in": 120000, ...}
+logger = logging.getLogger("pokeanalytics.stages")
+if not logger.handlers:
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+# records are kept per streamlit session (so stages run on query worker threads carrying the session's context
+# land in the same run), falling back to per thread outside streamlit
+_runs = OrderedDict()
+_runs_lock = threading.Lock()
+_local = threading.local()
+MAX_SESSIONS = 256
+
+def _run():
+    ctx = get_script_run_ctx(suppress_warning=True)
+    if ctx is None:
+        if not hasattr(_local, 'run'):
+            _local.run = {'records': [], 'start': time.perf_counter()}
+        return _local.run
+
+    with _runs_lock:
+        if ctx.session_id not in _runs:
+            _runs[ctx.session_id] = {'records': [], 'start': time.perf_counter()}
+            # sessions that went away are dropped oldest first
+            while len(_runs) > MAX_SESSIONS:
+                _runs.popitem(last=False)
+        return _runs[ctx.session_id]
+
+
+# POKE_DEBUG=1 shows the debug panel and records each stage's peak traced memory. tracemalloc is process wide
+# (and slows allocation-heavy code), so it's started once for the whole process rather than per session
+DEBUG = os.getenv("POKE_DEBUG") == "1"
+
+def start_run():
+    """
+    Starts collecting stage records for the current script run.
+    """
+    run = _run()
+    run['records'] = []
+    run['start'] = time.perf_counter()
+    if DEBUG and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+def get_records():
+    return list(_run()['records'])
+
+def record_stage(stage, seconds, rows_in=None, rows_out=None, peak_mb=None, **extra):
+    record = {'stage': stage, 'seconds': round(seconds, 4), 'rows_in': rows_in, 'rows_out': rows_out, 'peak_mb': peak_mb, **extra}
+    _run()['records'].append(record)
+    logger.info(json.dumps(record, default=str))
+    return record
+
+@contextmanager
+def stage(name, rows_in=None):
+    """
+    Times the enclosed block as one stage. Set info['rows_out'] (or any other key) inside the block to record it.
+
+    Stages aren't meant to be nested: with memory tracing on, each stage resets tracemalloc's peak (so peaks of
+    stages running concurrently on query threads are approximate).
+
+        with stage("movers", rows_in=len(df)) as info:
+            movers = compute_movers(df)
+            info['rows_out'] = len(movers)
+    """
+    info = {'rows_in': rows_in}
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        start_memory = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    try:
+        yield info
+    finally:
+        seconds = time.perf_counter() - start
+        peak_mb = round(max(tracemalloc.get_traced_memory()[1] - start_memory, 0) / 1e6, 2) if tracing else None
+        record_stage(name, seconds, peak_mb=peak_mb, **info)
+
+def timed(name=None):
+    """
+    Decorator recording each call as a stage, with rows in/out taken from the first argument and the result when
+    they have a length (e.g. DataFrames).
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            rows_in = _rows(args[0]) if args else None
+            with stage(name or func.__name__, rows_in=rows_in) as info:
+                result = func(*args, **kwargs)
+                info['rows_out'] = _rows(result)
+            return result
+        return wrapper
+    return decorator
+
+def _rows(obj):
+    try:
+        return len(obj)
+    except TypeError:
+        return None
+
+def show_debug_panel():
+    # per-stage breakdown of this run, to tell whether a slow page is the database, pandas or matplotlib
+    records = get_records()
+    total = time.perf_counter() - _run()['start']
+    with st.expander(f"Debug: {len(records)} stages, {total:.2f}s total"):
+        st.dataframe(pd.DataFrame(records))
@@ -0,0 +1,25 @@
+import pandas as pd
+import re
+from modules.processing import conform_dtypes, concat_compact
+
+
+def read_sql_compact(query, engine, params=None, chunksize=50000):
+    """
+    Streams a query through a server-side cursor and conforms each chunk to the compact schema as it arrives,
+    so the wide object/int64/float64 frame pandas would build by default is never held all at once.
+
+    The query takes named binds (:name) with params as a dict, which works on every driver.
+    """
+    from sqlalchemy import text
+    with engine.connect().execution_options(stream_results=True) as conn:
+        chunks = (conform_dtypes(chunk) for chunk in pd.read_sql(text(query), conn, params=params, chunksize=chunksize))
+        data = concat_compact(chunks)
+
+    print(f"read_sql_compact(): loaded {len(data)} rows, {data.memory_usage(deep=True).sum() / 1e6:.1f} MB")
+    return data
+
+def sql_identifier(name):
+    # column names are interpolated into the query, so only plain identifiers get through
+    if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", name):
+        raise ValueError(f"Invalid column name: {name!r}")
+    return f'"{name}"'
@@ -0,0 +1,86 @@
+import pandas as pd
+import numpy as np
+
+
+# carried over from each series' most recent row
+ATTRIBUTE_COLS = ['poke_name', 'poke_no', 'set_name', 'product_type', 'release_date']
+
+def series_keys(df):
+    """
+    Series number of each row per (poke_id, grade), for the segment computations.
+
+    Returns:
+        (rows, keys): positions of the rows that belong to a series and their series numbers. Rows with a null
+        poke_id or grade belong to none and are left out, like groupby drops them.
+    """
+    keys = df.groupby(['poke_id', 'grade'], observed=True, sort=False).ngroup().to_numpy(dtype='float64')
+    rows = np.flatnonzero(~np.isnan(keys) & (keys >= 0))
+    return rows, keys[rows].astype(np.int64)
+
+def compute_movers(df, months=3):
+    """
+    Computes the last price, trailing `months` average price and percent change between them for every
+    (poke_id, grade) series in a single pass, so each movers section is just a filter over the result.
+
+    Args:
+        df: feature_set rows with at least date, poke_id, grade and price.
+        months: number of most recent rows per series to average, default is 3.
+
+    Returns:
+        DataFrame with one row per (poke_id, grade), the attribute columns of its latest row,
+        last_{months}mo_avg_price, last_mo_price and perc_change (rounded int).
+    """
+    avg_col = f'last_{months}mo_avg_price'
+    rows, keys = series_keys(df)
+    if len(keys) == 0:
+        return pd.DataFrame(columns=['poke_id', 'grade'] + [col for col in ATTRIBUTE_COLS if col in df.columns] + [avg_col, 'last_mo_price', 'perc_change'])
+
+    # order rows by series, then date, so every series is a contiguous date-sorted segment
+    sorted_rows = np.lexsort((df['date'].to_numpy()[rows], keys))
+    order = rows[sorted_rows]
+    keys = keys[sorted_rows]
+    prices = df['price'].to_numpy(dtype='float64')[order]
+
+    counts = np.bincount(keys)
+    ends = np.cumsum(counts)
+    # position of each row counted back from the end of its segment (0 = latest)
+    from_end = ends[keys] - 1 - np.arange(len(keys))
+
+    window = (from_end < months) & ~np.isnan(prices)
+    window_sum = np.bincount(keys[window], weights=prices[window], minlength=len(counts))
+    window_count = np.bincount(keys[window], minlength=len(counts))
+
+    last_rows = order[ends - 1]
+    movers = df.iloc[last_rows][['poke_id', 'grade'] + [col for col in ATTRIBUTE_COLS if col in df.columns]].reset_index(drop=True)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        avg = window_sum / window_count
+        last = prices[ends - 1]
+        perc_change = (last - avg) / avg * 100
+
+    movers[avg_col] = avg
+    movers['last_mo_price'] = last
+    movers['perc_change'] = np.nan_to_num(perc_change, nan=0, posinf=0, neginf=0).round(0).astype(int)
+    return movers
+
+def top_movers(movers, min_price=25):
+    # movers whose latest price is at least min_price, biggest percent gain first
+    return movers.loc[movers['last_mo_price'] >= min_price].sort_values("perc_change", ascending=False)
+
+def build_tracking_index(movers):
+    """
+    Partitions the movers once into a {(set_name, grade): table} lookup for the price tracking view, each table
+    column-pruned and sorted by last price, so a set/grade selection is a dict lookup instead of a full scan.
+
+    Returns:
+        (index, sorted_sets) where sorted_sets lists the set names newest release first.
+    """
+    avg_col = next(col for col in movers.columns if col.endswith('mo_avg_price'))
+    columns = ['poke_name', 'poke_no', 'grade', avg_col, 'last_mo_price', 'perc_change']
+
+    ordered = movers.sort_values('last_mo_price', ascending=False, kind='stable')
+    index = {
+        key: group[columns].reset_index(drop=True)
+        for key, group in ordered.groupby(['set_name', 'grade'], observed=True, sort=False)
+    }
+    sorted_sets = movers.drop_duplicates('set_name').sort_values('release_date', ascending=False)['set_name'].tolist()
+    return index, sorted_sets
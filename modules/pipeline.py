@@ -0,0 +1,174 @@
+"""
+The dashboard's section computations, shared by app.py (live mode) and the headless precompute job, which runs
+them once per data refresh and writes every output to the artifact store for the app's precomputed mode.
+
+    python -m modules.pipeline                      # sync the snapshot, compute, write data/artifacts/<version>
+    python -m modules.pipeline --store /mnt/artifacts --keep 10
+    SERVE_PRECOMPUTED=1 streamlit run app.py        # the app then only reads the latest version
+"""
+import argparse
+from datetime import datetime
+import pandas as pd
+from modules.analysis import summarize_dataframe
+from modules.card_features import card_features
+from modules.cube import ReleaseCube
+from modules.instrument import timed
+from modules.movers import compute_movers
+from modules.processing import SET_METRIC_COLS, agg_by_set, get_winners, get_ripe_boxes, get_baby_sets, get_baby_boxes
+from modules.visuals import sprite_stats
+
+
+# only the columns the price tracking/movers sections read
+MOVER_COLUMNS = ['date', 'poke_id', 'poke_name', 'poke_no', 'grade', 'set_name', 'release_date', 'product_type', 'price']
+# rows per section query
+ROW_LIMIT = 300000
+# grade of the sidebar sprites' average price captions
+SPRITE_GRADE = 'psa_10'
+
+def dashboard_window(start='2021-01', end='2024-11', today=None):
+    """
+    Date range of the dashboard (yyyy-mm, end is the current month) and clipped_tail, the yyyy-mm of last month
+    (the current month is still being scraped).
+    """
+    from dateutil.relativedelta import relativedelta
+    last_month = (today or datetime.today()) - relativedelta(months=1)
+    return {'start': start, 'end': end, 'clipped_tail': last_month.strftime("%Y-%m")}
+
+def dashboard_filters(window):
+    # date range, removing the 1st 2 months of release data per set and unpriced rows, filtered in the query
+    from modules.cloud import feature_filters
+    return feature_filters(start=window['start'], end=window['end'], clip_months=2, price_above=0)
+
+def build_movers(df, months=3):
+    # last price, N month average and percent change for every (poke_id, grade), computed once for all the movers sections
+    return timed("compute_movers")(compute_movers)(df, months=months)
+
+def build_card_features(df, window=6):
+    # latest returns, volatility and drawdown of every (poke_id, grade)
+    return timed("card_features")(card_features)(df, window=window)
+
+def build_sprite_stats(df, grade=SPRITE_GRADE):
+    # all time average price per sidebar sprite pokemon, from the unfiltered movers columns
+    return timed("sprite stats")(sprite_stats)(df, grade=grade)
+
+def build_summary(filtered_df):
+    """
+    Returns:
+        (summary_df, filtered_df.shape, number of unique cards)
+    """
+    # deduplicate
+    print(f'...saving copy of deduped data (by poke_id & set_year) to analyze later...starting with {len(filtered_df)} rows')
+    unique_df = filtered_df.drop_duplicates(subset=['poke_name', "poke_id", 'set_year'], keep='first')
+    unique_df = unique_df.loc[unique_df.product_type == "card"]
+    summary_df = timed("summarize_dataframe")(summarize_dataframe)(filtered_df)
+    return summary_df, filtered_df.shape, len(unique_df)
+
+def build_set_aggregates(filtered_df, clipped_tail):
+    """
+    Returns:
+        (agg_by_set_df, release_cube, agg_modern_sets), the modern sets being 2022+ releases before clipped_tail.
+    """
+    agg_by_set_df = timed("agg_by_set")(agg_by_set)(filtered_df)
+    # set x months since release x metric, for release aligned comparisons
+    release_cube = timed("release cube")(ReleaseCube.from_frame)(filtered_df, SET_METRIC_COLS)
+    modern_sets = filtered_df.loc[filtered_df.release_date>="2022"]
+    modern_sets = modern_sets.loc[modern_sets.date<clipped_tail]
+    agg_modern_sets = timed("agg_by_set: modern")(agg_by_set)(modern_sets)
+    return agg_by_set_df, release_cube, agg_modern_sets
+
+def set_lists(agg_by_set_df):
+    # the set groupings charted by the set value/booster box sections
+    return {
+        'winners': list(get_winners(agg_by_set_df)),
+        'baby_sets': get_baby_sets(agg_by_set_df),
+        'ripe_boxes': get_ripe_boxes(agg_by_set_df),
+        'baby_boxes': get_baby_boxes(agg_by_set_df),
+    }
+
+def index_levels_long(levels):
+    # market index levels (date x index) as the long frame the charts take
+    return levels.reset_index().melt(id_vars='date', var_name='index', value_name='level')
+
+def summary_to_frame(summary_df):
+    # the summary table in a parquet friendly form: dtype as text, numeric stats with NaN for 'N/A'
+    frame = summary_df.rename_axis('column').reset_index()
+    frame['dtype'] = frame['dtype'].astype(str)
+    for col in ('min', 'max', 'mean'):
+        frame[col] = pd.to_numeric(frame[col], errors='coerce')
+    return frame
+
+def summary_from_frame(frame):
+    summary_df = frame.set_index('column').rename_axis(None)
+    for col in ('min', 'max', 'mean'):
+        summary_df[col] = summary_df[col].astype(object).where(summary_df[col].notna(), 'N/A')
+    return summary_df
+
+def compute_artifacts(window, months=3):
+    """
+    Runs every section's computation against the database (through the local snapshot, synced first) and
+    returns (frames, values) for artifacts.write_artifacts.
+    """
+    from modules.cloud import query_features, query_all_card_types
+    from modules.indices import MarketIndices, MAJOR_INDICES, index_columns
+    from modules.similarity import SimilarCards
+    from modules.snapshot import snapshot_version
+
+    filters = dashboard_filters(window)
+    filtered_df = timed("query: filtered")(query_features)(filters=filters, limit=ROW_LIMIT)
+    mover_df = timed("query: movers columns")(query_features)(columns=MOVER_COLUMNS, limit=ROW_LIMIT)
+    index_df = timed("query: index columns")(query_features)(columns=index_columns())
+    card_types = timed("query: card types")(query_all_card_types)()
+    # the query functions report failures with st.error and return None, which would be written as an artifact
+    for name, frame in (('feature_set', filtered_df), ('movers columns', mover_df), ('index columns', index_df), ('card types', card_types)):
+        if frame is None:
+            raise RuntimeError(f"Couldn't load {name}, see the error above")
+
+    movers = build_movers(mover_df, months=months)
+    features = build_card_features(mover_df)
+    summary_df, filtered_shape, unique_card_count = build_summary(filtered_df)
+    agg_by_set_df, release_cube, agg_modern_sets = build_set_aggregates(filtered_df, window['clipped_tail'])
+    index_levels = timed("market indices")(MarketIndices(MAJOR_INDICES).update)(index_df)
+    similar_buckets, similar_cards = timed("similar cards index")(SimilarCards.from_frame)(filtered_df).to_frames()
+
+    frames = {
+        'movers': movers,
+        'card_features': features,
+        'summary': summary_to_frame(summary_df),
+        'agg_by_set': agg_by_set_df,
+        'agg_modern_sets': agg_modern_sets,
+        'release_cube': release_cube.to_long(),
+        'agg_by_release': release_cube.to_frame(),
+        'market_indices': index_levels_long(index_levels),
+        'similar_buckets': similar_buckets,
+        'similar_cards': similar_cards,
+        'card_types': card_types,
+    }
+    values = {
+        'window': window,
+        'movers_months': months,
+        'filtered_shape': list(filtered_shape),
+        'unique_card_count': unique_card_count,
+        'set_lists': set_lists(agg_by_set_df),
+        'sprite_stats': build_sprite_stats(mover_df),
+        'data_version': snapshot_version(),
+        'max_date': filtered_df['date'].max(),
+    }
+    return frames, values
+
+def main():
+    from modules.artifacts import ARTIFACT_DIR, write_artifacts
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--store', default=ARTIFACT_DIR, help="artifact store directory")
+    parser.add_argument('--keep', type=int, default=5, help="number of versions to keep")
+    parser.add_argument('--start', default='2021-01', help="first month (yyyy-mm)")
+    parser.add_argument('--end', default='2024-11', help="last month (yyyy-mm)")
+    args = parser.parse_args()
+
+    frames, values = compute_artifacts(dashboard_window(args.start, args.end))
+    version = write_artifacts(frames, values, store=args.store, keep=args.keep)
+    print(version)
+
+
+if __name__ == "__main__":
+    main()
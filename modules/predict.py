@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# the FastAPI model endpoint; unset means the predictor isn't deployed yet
+PREDICT_URL = os.getenv("PREDICT_URL")
+# scores a JSON list of inputs in one request, returning a list of results in the same order
+PREDICT_BATCH_URL = os.getenv("PREDICT_BATCH_URL")
+# (connect, read) seconds
+PREDICT_TIMEOUT = (3.05, float(os.getenv("PREDICT_READ_TIMEOUT", 10)))
+PREDICT_CACHE_TTL = int(os.getenv("PREDICT_CACHE_TTL", 3600))
+
+def normalize_features(features):
+    # canonical, hashable form of an input: sorted keys, numeric strings/bools as numbers
+    normalized = []
+    for name in sorted(features):
+        value = features[name]
+        if isinstance(value, str):
+            try:
+                value = float(value)
+            except ValueError:
+                pass
+        if isinstance(value, (bool, float)) and float(value).is_integer():
+            value = int(value)
+        normalized.append((name, value))
+    return tuple(normalized)
+
+
+class PredictionClient:
+    """
+    Client for the price prediction endpoint.
+
+    - one pooled requests session, with timeouts and retries (with backoff) on connection errors and 502/503/504
+    - responses cached per normalized input (LRU, with a TTL), so identical queries from any session cost one
+      model call per TTL
+    - identical concurrent requests are coalesced: the first caller asks the server, the rest wait for its answer
+    - predict_batch scores many inputs (e.g. every card in a set) in one round trip
+
+        client = PredictionClient(PREDICT_URL)
+        client.predict(input_data)['price']
+    """
+
+    def __init__(self, url, batch_url=None, timeout=PREDICT_TIMEOUT, retries=3, cache_size=1024, ttl=PREDICT_CACHE_TTL, pool_size=10):
+        self.url = url
+        self.batch_url = batch_url or f"{url.rstrip('/')}/batch"
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.ttl = ttl
+
+        retry = Retry(total=retries, backoff_factor=0.3, status_forcelist=[502, 503, 504], allowed_methods=["POST"])
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'requests': 0}
+
+    def _cached(self, key):
+        # callers hold the lock
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if expires < time.monotonic():
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return result
+
+    def _store(self, key, result):
+        # callers hold the lock
+        self._cache[key] = (time.monotonic() + self.ttl, result)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _post(self, url, payload):
+        self.stats['requests'] += 1
+        response = self.session.post(url, json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def predict(self, features):
+        """
+        Prediction for one input (the predictor form's input_data), from the cache when possible. Raises
+        requests exceptions on failure, to every caller coalesced onto the failed request.
+        """
+        key = normalize_features(features)
+        with self._lock:
+            result = self._cached(key)
+            if result is not None:
+                self.stats['hits'] += 1
+                return result
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+                self.stats['misses'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            result = self._post(self.url, dict(key))
+            with self._lock:
+                self._store(key, result)
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def predict_batch(self, inputs):
+        """
+        Predictions for many inputs, in order. Cached inputs are served locally and the rest (deduplicated)
+        are scored in a single request to batch_url.
+        """
+        keys = [normalize_features(features) for features in inputs]
+        results = {}
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                result = self._cached(key)
+                if result is not None:
+                    results[key] = result
+            self.stats['hits'] += len(results)
+        missing = [key for key in dict.fromkeys(keys) if key not in results]
+
+        if missing:
+            self.stats['misses'] += len(missing)
+            scored = self._post(self.batch_url, [dict(key) for key in missing])
+            if len(scored) != len(missing):
+                raise ValueError(f"Batch endpoint returned {len(scored)} results for {len(missing)} inputs")
+            with self._lock:
+                for key, result in zip(missing, scored):
+                    self._store(key, result)
+                    results[key] = result
+
+        return [results[key] for key in keys]
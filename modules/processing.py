@@ -1,11 +1,78 @@
 import pandas as pd
 import numpy as np
-
+from modules.cube import ReleaseCube
+from modules.indices import MarketIndices
+
+
+# copy-on-write (always on from pandas 3): a frame derived from another never writes through to it, which is what
+# lets one parsed dataset be shared by every session (see shared_view)
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
+
+# string keys with few distinct values, stored as categoricals
+CATEGORY_COLS = ['set_name', 'poke_name', 'grade', 'product_type']
+DATE_COLS = ['date', 'release_date']
+# per set metrics, repeated on every row of the set in feature_set
+SET_METRIC_COLS = [
+    'avg_mo_price_sealed_in_set',
+    'avg_mo_price_card_in_set',
+    'top10_nm_card_mo_avg_in_set',
+    'top10_nm_card_mo_sum_in_set',
+    'bb_mo_price_by_set',
+    'avg_mo_price_psa_10_in_set',
+    'top10_mo_card_sum_to_bb_cost_ratio',
+]
+
+def is_price_col(col):
+    # prices and per set price metrics, the float columns that are fine as float32
+    return col == 'price' or col in SET_METRIC_COLS or col.endswith(('_in_set', '_by_set', '_ratio'))
+
+def shared_view(df):
+    """
+    A caller's handle on a frame shared across sessions: a shallow copy, so no data is copied, and under
+    copy-on-write a column is only copied if the caller writes to it. The shared frame itself is never modified.
+    """
+    return None if df is None else df.copy(deep=False)
 
 def conform_dtypes(df):
-    print("conform_dtypes(): df has column dtypes:", df.dtypes)
+    """
+    Converts a (chunk of) feature_set to a compact schema: categoricals for the string keys, int8 for the is_* flags,
+    float32 for prices/metrics, downcast ints and datetime64 for the date columns.
+
+    Other float columns stay float64: an integer column with a null in the chunk (e.g. poke_id) arrives as float64,
+    and float32 would merge ids above 2**24.
+    """
+    for col in df.columns:
+        if col in CATEGORY_COLS:
+            df[col] = df[col].astype('category')
+        elif col in DATE_COLS:
+            df[col] = pd.to_datetime(df[col])
+        elif col.startswith('is_'):
+            df[col] = df[col].fillna(0).astype('int8')
+        elif pd.api.types.is_float_dtype(df[col]) and is_price_col(col):
+            df[col] = df[col].astype('float32')
+        elif pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast='integer')
     return df
 
+def concat_compact(chunks):
+    """
+    Concatenates conformed chunks, unifying the categories first so the string keys stay categorical
+    (pd.concat falls back to object when the chunks' categories differ).
+    """
+    chunks = list(chunks)
+    if not chunks:
+        return pd.DataFrame()
+
+    for col in CATEGORY_COLS:
+        if col not in chunks[0].columns:
+            continue
+        categories = pd.Index(np.concatenate([chunk[col].cat.categories.to_numpy(dtype=object) for chunk in chunks])).unique()
+        for chunk in chunks:
+            chunk[col] = chunk[col].cat.set_categories(categories)
+
+    return pd.concat(chunks, ignore_index=True)
+
 def clip_sets(df):
     print(f"clip_sets(): Filtering df with len of {len(df)}, selecting sets where months_release>2")
     df = df.loc[df.mos_since_release>2]
@@ -13,55 +80,65 @@ def clip_sets(df):
 
     return df
 
-def agg_by_set(df):
-    # feature_set data is denormalized and aggregated, since that we just need to take the mean to get the respective metric (max, mean, min, etc) per set
-    df['date'] = pd.to_datetime(df['date'])
-
-    df.set_index('date', inplace=True)
-    agg = df.groupby(['set_name']).resample('ME').agg({
-        'avg_mo_price_sealed_in_set': 'mean',
-        'avg_mo_price_card_in_set': 'mean',
-        'top10_nm_card_mo_avg_in_set': 'mean',
-        'top10_nm_card_mo_sum_in_set': 'mean',
-        'bb_mo_price_by_set' : 'mean',
-        'avg_mo_price_psa_10_in_set' : 'mean',
-        'top10_mo_card_sum_to_bb_cost_ratio' : 'mean'
-    }).reset_index()
-
-    return agg
+def agg_monthly(df, key='set_name', columns=SET_METRIC_COLS, date_col='date'):
+    """
+    Mean of `columns` per (key, calendar month), labeled by month end like groupby(key).resample('ME'), in one flat
+    pass: dates are mapped to month codes once and every metric is summed with np.bincount over (key, month) bins.
 
-def agg_by_release(df):
-    agg = df.groupby(['set_name', 'mos_since_release'], as_index=False).agg({
-        'avg_mo_price_sealed_in_set': 'mean',
-        'avg_mo_price_card_in_set': 'mean',
-        'top10_nm_card_mo_avg_in_set': 'mean',
-        'top10_nm_card_mo_sum_in_set': 'mean',
-        'bb_mo_price_by_set' : 'mean',
-        'avg_mo_price_psa_10_in_set' : 'mean',
-        'top10_mo_card_sum_to_bb_cost_ratio' : 'mean'
+    Like resample, each key gets a row for every month between its first and last, with NaN for months without data.
+    The input isn't modified.
+    """
+    keys = df[key]
+    if isinstance(keys.dtype, pd.CategoricalDtype):
+        codes, uniques = keys.cat.codes.to_numpy(), keys.cat.categories
+    else:
+        codes, uniques = pd.factorize(keys, sort=True)
+    dates = pd.to_datetime(df[date_col])
+    months = dates.to_numpy().astype('datetime64[M]').astype(np.int64)
+
+    valid = (codes >= 0) & ~np.isnat(dates.to_numpy())
+    codes, months = codes[valid], months[valid]
+    if len(codes) == 0:
+        return pd.DataFrame(columns=[key, date_col] + list(columns))
+
+    # each key's span of months, laid end to end
+    n_keys = len(uniques)
+    first = np.full(n_keys, np.iinfo(np.int64).max)
+    last = np.full(n_keys, np.iinfo(np.int64).min)
+    np.minimum.at(first, codes, months)
+    np.maximum.at(last, codes, months)
+    present = np.flatnonzero(last >= first)
+    spans = np.zeros(n_keys, dtype=np.int64)
+    spans[present] = last[present] - first[present] + 1
+    offsets = np.cumsum(spans) - spans
+    bins = offsets[codes] + months - first[codes]
+    n_bins = int(spans.sum())
+
+    out_codes = np.repeat(np.arange(n_keys), spans)
+    out_months = first[out_codes] + np.arange(n_bins) - offsets[out_codes]
+    # label each month by its last day, like resample('ME')
+    month_end = (out_months + 1).astype('datetime64[M]').astype('datetime64[D]') - np.timedelta64(1, 'D')
+
+    agg = pd.DataFrame({
+        key: pd.Categorical.from_codes(out_codes, categories=uniques) if isinstance(keys.dtype, pd.CategoricalDtype) else uniques[out_codes],
+        date_col: pd.DatetimeIndex(month_end).as_unit(dates.dt.unit),
     })
+    for col in columns:
+        values = df[col].to_numpy()[valid]
+        notnull = ~np.isnan(values)
+        sums = np.bincount(bins[notnull], weights=values[notnull], minlength=n_bins)
+        counts = np.bincount(bins[notnull], minlength=n_bins)
+        with np.errstate(invalid='ignore'):
+            agg[col] = (sums / counts).astype(np.result_type(values.dtype, np.float32))
+    return agg
 
-    # Create a new DataFrame to fill in missing months for each set
-    max_months = agg['mos_since_release'].max()
-    all_months = pd.DataFrame({'mos_since_release': np.arange(0, max_months + 1)})
-
-    # Create a DataFrame for each set with all months
-    result = (
-        agg
-        .set_index(['set_name', 'mos_since_release'])
-        .unstack(level=0)
-    )
-
-    # Merge with all_months to ensure all months are represented
-    result = result.reindex(all_months['mos_since_release'].values, fill_value=np.nan).reset_index()
-
-    # Reset column names for better handling
-    result.columns = ['mos_since_release'] + [f'avg_price_{col}' for col in result.columns[1:]]
-
-    # Fill missing values with forward fill (or you can use any method that suits your analysis)
-    #result.fillna(method='ffill', inplace=True)
+def agg_by_set(df):
+    # feature_set data is denormalized and aggregated, since that we just need to take the mean to get the respective metric (max, mean, min, etc) per set
+    return agg_monthly(df, 'set_name', SET_METRIC_COLS)
 
-    return result
+def agg_by_release(df):
+    # mean of each set metric per months since release, one column per (metric, set); see ReleaseCube for slicing without the wide frame
+    return ReleaseCube.from_frame(df, SET_METRIC_COLS).to_frame()
 
 # based on top 10 card valuation
 def get_winners(df):
@@ -70,30 +147,30 @@ def get_winners(df):
 
 def get_ripe_boxes(df):
     # find the maximum value of 'bb_mo_price_by_set' for each group
-    grouped = df.groupby('set_name')['bb_mo_price_by_set'].max()
+    grouped = df.groupby('set_name', observed=True)['bb_mo_price_by_set'].max()
 
     # max 'bb_mo_price_by_set' is between 500 and 1000
     filtered_sets = grouped[(grouped >= 200) & (grouped <= 1500)].index.tolist()
     return filtered_sets
 
 def get_baby_boxes(df):
-    grouped = df.groupby('set_name')['bb_mo_price_by_set'].max()
+    grouped = df.groupby('set_name', observed=True)['bb_mo_price_by_set'].max()
 
     filtered_sets = grouped[(grouped <= 200)].index.tolist()
     return filtered_sets
 
 def get_baby_sets(df):
-    grouped_max = df.groupby('set_name')['top10_nm_card_mo_sum_in_set'].max()
+    grouped_max = df.groupby('set_name', observed=True)['top10_nm_card_mo_sum_in_set'].max()
 
     sets_never_exceeding_700 = grouped_max[grouped_max <= 700].index.tolist()
     return sets_never_exceeding_700
 
-def create_major_index(df):
+def create_major_index(df, spec, name='index'):
     """
-    i.e. filter by something and averages the DF into 1 line chart, representing broad index like 2021 sets, top50 charizard index, alt art index,
-                gallery_index  
+    One index series (e.g. 2021 sets, charizard, gallery) from a spec like those in indices.MAJOR_INDICES. To compute
+    several at once, or keep one up to date as months land, use indices.MarketIndices directly.
     """
-    return df
+    return MarketIndices({name: spec}).update(df)[name]
 
 # yyyy-mm or yyyy
 def select_by_date(df, head, tail):
@@ -0,0 +1,149 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class VersionedCache:
+    """
+    Process wide cache of loaded data that follows a cheap data version probe instead of a fixed TTL.
+
+    - concurrent misses on a key are coalesced: the first caller runs the load, the rest wait for its result
+    - the probe runs at most once per `ttl` seconds. When the version it reports moves on, the keys in use (those
+      requested in the last `ttl` seconds) are reloaded in one background job while callers keep getting the
+      previous data, then the new data is swapped in all at once (so a page never mixes two versions). Keys no
+      longer in use, e.g. one-off queries, are dropped rather than reloaded
+    - a failed refresh keeps serving the previous data and is retried on the next probe
+
+        cache = VersionedCache(probe=lambda: pd.read_sql("SELECT max(date) ...", engine).iloc[0].tolist(), ttl=300)
+        data = cache.get(('feature_set', limit), lambda: load(limit))
+        cache.version()         # version of the data being served, e.g. to key downstream caches on
+    """
+
+    def __init__(self, probe, ttl=300, max_entries=16):
+        self.probe = probe
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+        self._entries = OrderedDict()   # key -> (value, load, last requested at)
+        self._in_flight = {}
+        self._served = None
+        self._probed = None
+        self._probed_at = None
+        self._refreshing = False
+        self._retry_at = 0
+        self._lock = threading.Lock()
+        self._probe_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="refresh")
+        self.stats = {'hits': 0, 'misses': 0, 'coalesced': 0, 'refreshes': 0, 'failed_refreshes': 0}
+
+    def _probe(self):
+        # latest version the probe reported, probing again once it's older than ttl (one caller probes, the rest
+        # use the previous answer meanwhile)
+        if self._probed_at is not None and time.monotonic() - self._probed_at < self.ttl:
+            return self._probed
+        if not self._probe_lock.acquire(blocking=self._probed_at is None):
+            return self._probed
+        try:
+            try:
+                self._probed = self.probe()
+            except Exception as e:
+                # database unreachable, keep serving what we have
+                print(f"VersionedCache: version probe failed ({e})")
+            self._probed_at = time.monotonic()
+            return self._probed
+        finally:
+            self._probe_lock.release()
+
+    def version(self):
+        """
+        Version of the data being served. If the probe reports a newer one, a background refresh is started and
+        the current version is returned until it completes.
+        """
+        probed = self._probe()
+        with self._lock:
+            if self._served is None and not self._entries:
+                self._served = probed
+            elif probed is not None and probed != self._served and not self._refreshing and time.monotonic() >= self._retry_at:
+                self._refreshing = True
+                self._executor.submit(self._refresh, probed)
+            return self._served
+
+    def get(self, key, load):
+        """
+        Cached value of key, calling load() on a miss (once, however many callers miss at the same time).
+        Exceptions from load() are raised to every waiting caller and nothing is cached.
+        """
+        self.version()
+        with self._lock:
+            if key in self._entries:
+                value, load, _ = self._entries[key]
+                self._entries[key] = (value, load, time.monotonic())
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return value
+            future = self._in_flight.get(key)
+            owner = future is None
+            if owner:
+                future = self._in_flight[key] = Future()
+                self.stats['misses'] += 1
+            else:
+                self.stats['coalesced'] += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = load()
+            with self._lock:
+                self._store(key, value, load)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+
+    def _store(self, key, value, load, requested_at=None):
+        # callers hold the lock
+        self._entries[key] = (value, load, time.monotonic() if requested_at is None else requested_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _refresh(self, version):
+        started_at = time.monotonic()
+        with self._lock:
+            keys = [(key, load, requested_at) for key, (_, load, requested_at) in self._entries.items()
+                    if requested_at >= started_at - self.ttl]
+        start = time.perf_counter()
+        try:
+            fresh = [(key, load(), load, requested_at) for key, load, requested_at in keys]
+        except Exception as e:
+            print(f"VersionedCache: refresh to {version} failed ({e}), serving {self._served}")
+            with self._lock:
+                self.stats['failed_refreshes'] += 1
+                self._refreshing = False
+                self._retry_at = time.monotonic() + self.ttl
+            return
+
+        with self._lock:
+            # entries that weren't reloaded hold the previous version's data; ones first loaded during the
+            # refresh are kept
+            for key in [key for key, (_, _, requested_at) in self._entries.items() if requested_at < started_at]:
+                del self._entries[key]
+            for key, value, load, requested_at in fresh:
+                # a key requested again during the refresh keeps its latest request time
+                requested_at = max(requested_at, self._entries[key][2]) if key in self._entries else requested_at
+                self._store(key, value, load, requested_at)
+            self._served = version
+            self._refreshing = False
+            self.stats['refreshes'] += 1
+        print(f"VersionedCache: refreshed {len(fresh)} entries to {version} in {time.perf_counter() - start:.2f}s")
+
+    def clear(self):
+        # the next get of every key reloads (coalesced), e.g. after a manual fix to the data
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+from pathlib import Path
+import pandas as pd
+from modules.loader import sql_identifier
+
+
+# running psa_data counts per card_type (and breakdown), so the card type charts don't GROUP BY the whole table,
+# which only grows
+ROLLUP_PATH = Path(os.getenv("CARD_TYPE_ROLLUP_PATH", Path(__file__).parent.parent / "data" / "card_type_rollup.parquet"))
+# psa_data's ingestion timestamp (or increasing id) column; without one each update recounts the whole table
+PSA_WATERMARK_COLUMN = os.getenv('PSA_WATERMARK_COLUMN')
+# psa_data columns counted alongside card_type, for per set/per grade breakdowns, e.g. set_name,grade. Off by
+# default: each one multiplies the rollup's rows
+ROLLUP_DIMENSIONS = [col for col in os.getenv('CARD_TYPE_ROLLUP_BY', '').split(',') if col]
+
+
+def _dimensions():
+    return ['card_type'] + ROLLUP_DIMENSIONS
+
+def _grouped_counts(engine, where="", params=None):
+    from sqlalchemy import text
+    columns = ", ".join(sql_identifier(col) for col in _dimensions())
+    query = f"SELECT {columns}, COUNT(*) AS count FROM psa_data {where} GROUP BY {columns}"
+    return pd.read_sql(text(query), engine, params=params)
+
+def _add_counts(*frames):
+    # sums count frames over the rollup dimensions (NULL card types/sets/grades are groups of their own)
+    frames = [frame for frame in frames if frame is not None and len(frame)]
+    if not frames:
+        return pd.DataFrame({**{col: pd.Series(dtype=object) for col in _dimensions()}, 'count': pd.Series(dtype='int64')})
+    counts = pd.concat(frames, ignore_index=True).groupby(_dimensions(), dropna=False, as_index=False)['count'].sum()
+    return counts.astype({'count': 'int64'})
+
+def read_rollup(path=ROLLUP_PATH):
+    """
+    Returns:
+        (rollup, watermark): the stored counts (dimensions plus base and tail columns) and the watermark they
+        were taken at, or (None, None) before the first update.
+    """
+    import pyarrow.parquet as pq
+    path = Path(path)
+    if not path.exists():
+        return None, None
+    table = pq.read_table(path)
+    meta = json.loads(table.schema.metadata.get(b'rollup', b'{}'))
+    return table.to_pandas(), meta.get('watermark')
+
+def write_rollup(rollup, watermark, path=ROLLUP_PATH):
+    # the watermark is stored in the parquet metadata, so counts and watermark are swapped in together
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    table = pa.Table.from_pandas(rollup, preserve_index=False)
+    meta = {**(table.schema.metadata or {}), b'rollup': json.dumps({'watermark': watermark}, default=str).encode()}
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        pq.write_table(table.replace_schema_metadata(meta), tmp_path)
+        os.replace(tmp_path, path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+def _save_rollup(rollup, watermark, path):
+    # a read-only or full disk shouldn't fail the update, the counts are still served (and recounted next time)
+    try:
+        write_rollup(rollup, watermark, path)
+    except OSError as e:
+        print(f"update_rollup(): couldn't write {path} ({e}), serving the rollup from memory")
+
+# concurrent updates in one process run one at a time
+_update_lock = threading.Lock()
+
+def update_rollup(engine, path=ROLLUP_PATH):
+    """
+    Brings the rollup up to date with psa_data and returns it.
+
+    With PSA_WATERMARK_COLUMN, only rows at or past the stored watermark are counted. Rows before the newest
+    watermark value are added to the base counts. Rows at it are recounted into `tail` on every update, since
+    the scraper can still be inserting them (the same idea as the snapshot re-pulling its last month). Rows
+    without a watermark aren't counted. Without the column, the whole table is recounted, which costs the same
+    scan as before but only once per data version, and it still feeds the breakdowns.
+    """
+    from sqlalchemy import text
+    with _update_lock:
+        if PSA_WATERMARK_COLUMN is None:
+            counts = _grouped_counts(engine)
+            rollup = counts.rename(columns={'count': 'base'}).assign(tail=0)
+            _save_rollup(rollup, None, path)
+            return rollup
+
+        column = sql_identifier(PSA_WATERMARK_COLUMN)
+        stored, watermark = read_rollup(path)
+        with engine.connect() as conn:
+            newest = conn.execute(text(f"SELECT MAX({column}) FROM psa_data")).scalar()
+        if newest is None:
+            rollup = _add_counts().rename(columns={'count': 'base'}).assign(tail=0)
+            _save_rollup(rollup, None, path)
+            return rollup
+
+        if stored is None or watermark is None:
+            print("update_rollup(): no local rollup, counting psa_data")
+            base = _grouped_counts(engine, f"WHERE {column} < :newest", {'newest': newest})
+        else:
+            delta = _grouped_counts(engine, f"WHERE {column} >= :watermark AND {column} < :newest", {'watermark': watermark, 'newest': newest})
+            print(f"update_rollup(): {int(delta['count'].sum())} rows since watermark {watermark}")
+            base = _add_counts(stored[_dimensions()].assign(count=stored['base']), delta)
+        tail = _grouped_counts(engine, f"WHERE {column} >= :newest", {'newest': newest})
+
+        rollup = base.rename(columns={'count': 'base'}).merge(tail.rename(columns={'count': 'tail'}), on=_dimensions(), how='outer')
+        rollup = rollup.fillna({'base': 0, 'tail': 0}).astype({'base': 'int64', 'tail': 'int64'})
+        _save_rollup(rollup, newest, path)
+        return rollup
+
+def card_type_counts(rollup, by=(), min_count=50):
+    """
+    Card type counts from the rollup, fewest first, keeping card types with at least min_count rows in total
+    (the old HAVING COUNT(*) >= 50). Costs a groupby over the rollup's rows, however large psa_data gets.
+
+    Args:
+        by: breakdown columns (of ROLLUP_DIMENSIONS), e.g. ['grade'] for card_type x grade counts.
+    """
+    missing = [col for col in by if col not in rollup.columns]
+    if missing:
+        raise ValueError(f"The rollup isn't broken down by {missing}, add them to CARD_TYPE_ROLLUP_BY")
+    keys = ['card_type', *by]
+    counts = rollup[keys].assign(count=rollup['base'] + rollup['tail'])
+    counts = counts.groupby(keys, dropna=False, as_index=False)['count'].sum()
+    totals = counts.groupby('card_type', dropna=False)['count'].transform('sum')
+    return counts.loc[totals >= min_count].sort_values('count', kind='stable').reset_index(drop=True)
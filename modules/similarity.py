@@ -0,0 +1,160 @@
+import pandas as pd
+import numpy as np
+
+
+# card attributes from the predictor form, one bit each; ir_score (0=NA, 1=IR, 2=SIR) takes two more bits
+SIMILARITY_FLAGS = ['is_secret', 'is_full_art', 'is_tag_team', 'is_alt_art', 'is_eeveelution', 'is_legendary', 'is_og_char']
+IR_BITS = 2
+N_BITS = len(SIMILARITY_FLAGS) + IR_BITS
+# number of set bits of every code
+_POPCOUNT = np.array([bin(code).count('1') for code in range(1 << N_BITS)], dtype=np.int8)
+
+def attribute_code(flags, ir_score=0):
+    """
+    Packs a card's attributes into an integer bitset. ir_score is stored thermometer style (NA=00, IR=01, SIR=11)
+    so IR vs SIR is one bit apart and NA vs SIR two.
+
+    Args:
+        flags: {flag: 0/1} for SIMILARITY_FLAGS, missing flags count as 0.
+    """
+    code = 0
+    for bit, flag in enumerate(SIMILARITY_FLAGS):
+        code |= int(bool(flags.get(flag, 0))) << bit
+    ir_score = min(max(int(ir_score), 0), IR_BITS)
+    return code | (((1 << ir_score) - 1) << len(SIMILARITY_FLAGS))
+
+def _attribute_codes(df):
+    # vectorized attribute_code for every row; flags missing from the table count as 0
+    codes = np.zeros(len(df), dtype=np.int64)
+    for bit, flag in enumerate(SIMILARITY_FLAGS):
+        if flag in df.columns:
+            codes |= (df[flag].to_numpy() == 1).astype(np.int64) << bit
+    codes |= ((1 << _ir_scores(df)) - 1) << len(SIMILARITY_FLAGS)
+    return codes
+
+def _ir_scores(df):
+    # ir_score per row (0=NA, 1=IR, 2=SIR); feature_set has the is_ir/is_sir flags rather than an ir_score column
+    if 'ir_score' in df.columns:
+        ir_score = np.nan_to_num(df['ir_score'].to_numpy(dtype=np.float64))
+    else:
+        is_ir = (df['is_ir'].to_numpy() == 1) if 'is_ir' in df.columns else np.zeros(len(df), dtype=bool)
+        is_sir = (df['is_sir'].to_numpy() == 1) if 'is_sir' in df.columns else np.zeros(len(df), dtype=bool)
+        ir_score = np.where(is_sir, 2, is_ir.astype(np.int64))
+    return np.clip(ir_score, 0, IR_BITS).astype(np.int64)
+
+
+class SimilarCards:
+    """
+    Attribute index over card prices by months since release, for "cards like this performed like".
+
+    Rows are bucketed once by (grade, attribute bitset) and each bucket keeps the price sum and row count per month
+    since release, so a query only combines the buckets within a Hamming distance of the queried bitset (a few
+    hundred at most) instead of scanning the price history.
+
+        similar = SimilarCards.from_frame(df)
+        similar.trajectory({'is_full_art': 1, 'is_legendary': 1}, ir_score=0, grade='psa_10')
+    """
+
+    def __init__(self, grades, sums, counts, cards):
+        self.grades = pd.Index(grades)
+        # (grade, code, month) price sums and row counts, and distinct cards per (grade, code)
+        self.sums = sums
+        self.counts = counts
+        self.cards = cards
+
+    @classmethod
+    def from_frame(cls, df):
+        """
+        Args:
+            df: feature_set rows with grade, price, mos_since_release, poke_id and the SIMILARITY_FLAGS and
+                is_ir/is_sir (or ir_score) columns it has. Unpriced (0) rows and rows before release are left out.
+        """
+        grades = df['grade']
+        if isinstance(grades.dtype, pd.CategoricalDtype):
+            grade_codes, grade_names = grades.cat.codes.to_numpy(), grades.cat.categories
+        else:
+            grade_codes, grade_names = pd.factorize(grades, sort=True)
+        months = df['mos_since_release'].to_numpy().astype(np.int64)
+        prices = df['price'].to_numpy(dtype=np.float64)
+        valid = (grade_codes >= 0) & (months >= 0) & (prices > 0)
+
+        codes = _attribute_codes(df)[valid]
+        grade_codes, months, prices = grade_codes[valid].astype(np.int64), months[valid], prices[valid]
+        n_codes = 1 << N_BITS
+        n_months = int(months.max()) + 1 if len(months) else 0
+        shape = (len(grade_names), n_codes, n_months)
+
+        cells = (grade_codes * n_codes + codes) * n_months + months
+        sums = np.bincount(cells, weights=prices, minlength=np.prod(shape)).reshape(shape)
+        counts = np.bincount(cells, minlength=np.prod(shape)).reshape(shape)
+
+        # distinct cards per bucket
+        buckets = grade_codes * n_codes + codes
+        series = pd.DataFrame({'bucket': buckets, 'poke_id': df['poke_id'].to_numpy()[valid]}).drop_duplicates()
+        cards = np.bincount(series['bucket'].to_numpy(), minlength=shape[0] * n_codes).reshape(shape[:2])
+        return cls(grade_names, sums, counts, cards)
+
+    def to_frames(self):
+        """
+        The index as two long tables, (grade, code, mos_since_release, price_sum, rows) for every non empty cell
+        and (grade, code, cards), for storing it; from_buckets reads them back.
+        """
+        g, code, month = np.nonzero(self.counts)
+        buckets = pd.DataFrame({
+            'grade': pd.Categorical.from_codes(g, categories=self.grades), 'code': code, 'mos_since_release': month,
+            'price_sum': self.sums[g, code, month], 'rows': self.counts[g, code, month],
+        })
+        g, code = np.nonzero(self.cards)
+        cards = pd.DataFrame({'grade': pd.Categorical.from_codes(g, categories=self.grades), 'code': code, 'cards': self.cards[g, code]})
+        return buckets, cards
+
+    @classmethod
+    def from_buckets(cls, buckets, cards):
+        grades = pd.Index(buckets['grade'].cat.categories if isinstance(buckets['grade'].dtype, pd.CategoricalDtype) else sorted(buckets['grade'].unique()))
+        n_months = int(buckets['mos_since_release'].max()) + 1 if len(buckets) else 0
+        shape = (len(grades), 1 << N_BITS, n_months)
+        sums = np.zeros(shape)
+        counts = np.zeros(shape, dtype=np.int64)
+        g = grades.get_indexer(buckets['grade'])
+        sums[g, buckets['code'], buckets['mos_since_release']] = buckets['price_sum']
+        counts[g, buckets['code'], buckets['mos_since_release']] = buckets['rows']
+        card_counts = np.zeros(shape[:2], dtype=np.int64)
+        card_counts[grades.get_indexer(cards['grade']), cards['code']] = cards['cards']
+        return cls(grades, sums, counts, card_counts)
+
+    def matches(self, code, grade, min_cards=10, max_distance=N_BITS):
+        """
+        Bitsets to pool for a query: exact matches, widened to the nearest Hamming distance that reaches
+        min_cards distinct cards (or max_distance).
+
+        Returns:
+            (codes, distance, n_cards), codes empty when the grade isn't in the index.
+        """
+        if grade not in self.grades:
+            return np.array([], dtype=np.int64), None, 0
+        cards = self.cards[self.grades.get_loc(grade)]
+        distances = _POPCOUNT[np.arange(len(cards)) ^ code]
+        for distance in range(max_distance + 1):
+            codes = np.flatnonzero((distances <= distance) & (cards > 0))
+            n_cards = int(cards[codes].sum())
+            if n_cards >= min_cards:
+                break
+        return codes, distance, n_cards
+
+    def trajectory(self, flags, ir_score=0, grade='nearmint', min_cards=10, max_distance=N_BITS):
+        """
+        Average price by months since release of the cards with matching attributes in a grade.
+
+        Returns:
+            (DataFrame of mos_since_release, avg_price and rows, Hamming distance used, number of cards matched).
+        """
+        codes, distance, n_cards = self.matches(attribute_code(flags, ir_score), grade, min_cards, max_distance)
+        if len(codes) == 0:
+            return pd.DataFrame(columns=['mos_since_release', 'avg_price', 'rows']), distance, 0
+        g = self.grades.get_loc(grade)
+        sums = self.sums[g, codes].sum(axis=0)
+        counts = self.counts[g, codes].sum(axis=0)
+        with np.errstate(invalid='ignore'):
+            avg = sums / counts
+        months = np.flatnonzero(counts)
+        return pd.DataFrame({'mos_since_release': months, 'avg_price': avg[months], 'rows': counts[months]}), distance, n_cards
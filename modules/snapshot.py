@@ -0,0 +1,109 @@
+import operator
+import os
+import threading
+from pathlib import Path
+import pandas as pd
+from modules.loader import read_sql_compact
+from modules.processing import conform_dtypes, concat_compact
+
+
+# local columnar copy of feature_set, so cold starts read parquet instead of pulling the whole table from RDS
+SNAPSHOT_PATH = Path(os.getenv("FEATURE_SNAPSHOT_PATH", Path(__file__).parent.parent / "data" / "feature_set.parquet"))
+
+
+# snapshots that couldn't be written (e.g. a read-only container filesystem), served from memory instead
+_unwritten = {}
+FILTER_OPS = {'==': operator.eq, '!=': operator.ne, '>': operator.gt, '>=': operator.ge, '<': operator.lt, '<=': operator.le}
+
+def _filter_frame(df, columns=None, filters=None):
+    # the pyarrow (column, op, value) predicates applied in pandas, for in-memory snapshots
+    mask = pd.Series(True, index=df.index)
+    for column, op, value in filters or ():
+        if op == 'in':
+            mask &= df[column].isin(value)
+        elif op == 'not in':
+            mask &= ~df[column].isin(value)
+        else:
+            mask &= FILTER_OPS[op](df[column], value)
+    df = df.loc[mask]
+    return df[list(columns)] if columns else df
+
+def read_snapshot(path=SNAPSHOT_PATH, columns=None, filters=None):
+    """
+    Reads the snapshot, optionally projected to `columns` and filtered with (column, op, value) predicates,
+    which pyarrow applies while scanning so skipped rows/columns are never materialized.
+    """
+    path = Path(path)
+    if path in _unwritten:
+        return _filter_frame(_unwritten[path], columns, filters).reset_index(drop=True)
+    if not path.exists():
+        return None
+    # no-op for snapshots already written in the compact schema
+    return conform_dtypes(pd.read_parquet(path, columns=columns, filters=list(filters) if filters else None))
+
+def write_snapshot(df, path=SNAPSHOT_PATH):
+    # write to a temp file then swap it in, so a concurrent reader never sees a half written snapshot
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    except OSError:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+# concurrent queries in one process sync one at a time, the later ones then find the snapshot current
+_sync_lock = threading.Lock()
+
+def sync_snapshot(engine, path=SNAPSHOT_PATH):
+    """
+    Brings the snapshot up to date with feature_set, returns True if it changed.
+
+    Only rows dated on or after the snapshot's date watermark are pulled. The watermark month itself is
+    re-pulled and replaced, since the scraper can still be appending rows for it.
+    """
+    with _sync_lock:
+        return _sync_snapshot(engine, path)
+
+def _sync_snapshot(engine, path):
+    path = Path(path)
+    if not path.exists() and path not in _unwritten:
+        print("sync_snapshot(): no local snapshot, pulling full feature_set")
+        data = read_sql_compact("SELECT * FROM feature_set", engine)
+    else:
+        dates = read_snapshot(path, columns=['date'])['date']
+        watermark = dates.max()
+        # passed as an untyped iso literal so the comparison works whether feature_set.date is text, date or timestamp
+        fresh = read_sql_compact("SELECT * FROM feature_set WHERE date >= :watermark", engine, params={'watermark': watermark.strftime('%Y-%m-%d')})
+        print(f"sync_snapshot(): pulled {len(fresh)} rows since watermark {watermark}")
+        if len(fresh) == (dates == watermark).sum():
+            return False
+        snapshot = read_snapshot(path)
+        data = concat_compact([snapshot.loc[snapshot['date'] < watermark], fresh])
+
+    if "Unnamed: 0" in data.columns:
+        data = data.drop(columns=["Unnamed: 0"])
+
+    try:
+        write_snapshot(data, path)
+        _unwritten.pop(path, None)
+    except OSError as e:
+        # the data was pulled fine, keep serving it from memory
+        print(f"sync_snapshot(): couldn't write {path} ({e}), keeping the snapshot in memory")
+        _unwritten[path] = data
+    return True
+
+def refresh_snapshot(engine, path=SNAPSHOT_PATH):
+    sync_snapshot(engine, path)
+    return read_snapshot(path)
+
+def snapshot_version(path=SNAPSHOT_PATH):
+    # changes whenever a sync rewrites the snapshot, for caches of anything derived from it
+    path = Path(path)
+    if path in _unwritten:
+        return f"memory-{id(_unwritten[path])}-{len(_unwritten[path])}"
+    if not path.exists():
+        return None
+    stat = path.stat()
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
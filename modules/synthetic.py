@@ -0,0 +1,105 @@
+import pandas as pd
+import numpy as np
+from modules.config import feature_descriptions
+from modules.processing import conform_dtypes
+
+
+GRADES = ['nearmint', 'psa_10', 'psa_9', 'psa_8', 'psa_7', 'bgs_9_half']
+# rough price multiple of each grade over near mint
+GRADE_PREMIUM = {'nearmint': 1.0, 'psa_10': 4.0, 'psa_9': 1.8, 'psa_8': 1.2, 'psa_7': 0.9, 'bgs_9_half': 2.5}
+# share of cards carrying each flag
+FLAG_RATES = {
+    'is_secret': 0.08, 'is_full_art': 0.12, 'is_full_art_secret': 0.04, 'is_ir': 0.10, 'is_sir': 0.05,
+    'is_ultra_rare': 0.15, 'is_shiny_rare': 0.03, 'is_eeveelution': 0.03, 'is_legendary': 0.06,
+    'is_og_char': 0.05, 'is_gallery': 0.04, 'is_tag_team': 0.03, 'is_alt_art': 0.04,
+}
+SET_METRICS = [col for col in feature_descriptions if col.endswith('_in_set') or col.endswith('_by_set') or col.endswith('_ratio')]
+
+def make_feature_set(n_sets=40, cards_per_set=80, months=48, grades=GRADES, start="2020-01", seed=0, compact=True):
+    """
+    Generates a synthetic feature_set frame with the same columns as the RDS table, for benchmarks and offline runs.
+
+    Every set has one booster box (product_type sealed) plus cards_per_set cards, each priced monthly in every grade
+    from the set's release until the last month. Card prices follow a lognormal base times a random walk; the
+    set-level metrics are per (set, month) random walks repeated on every row of the set, like the denormalized table.
+
+    Args:
+        n_sets: number of sets, released at random months across (and up to a year before) the window.
+        cards_per_set: cards per set, excluding the booster box.
+        months: number of monthly price dates.
+        grades: grades each card is priced in.
+        start: first price date (yyyy-mm).
+        seed: random seed.
+        compact: conform to the compact schema used by the loaders (processing.conform_dtypes).
+    """
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=months, freq='MS')
+    # sets release across the window, the first few before it starts
+    release_month = np.sort(rng.integers(-12, months - 3, n_sets))
+    release_dates = pd.DatetimeIndex([dates[0] + pd.DateOffset(months=int(m)) for m in release_month])
+    set_names = np.array([f"synthetic-set-{i:03d}" for i in range(n_sets)], dtype=object)
+
+    n_products = cards_per_set + 1
+    n_grades = len(grades)
+
+    # one row per (set, product, grade, month) priced since the set's release
+    s, p, g, m = np.meshgrid(np.arange(n_sets), np.arange(n_products), np.arange(n_grades), np.arange(months), indexing='ij')
+    s, p, g, m = s.ravel(), p.ravel(), g.ravel(), m.ravel()
+    released = m >= np.maximum(release_month[s], 0)
+    s, p, g, m = s[released], p[released], g[released], m[released]
+    n = len(s)
+
+    # product 0 of every set is its booster box
+    is_box = p == 0
+    card_key = s * n_products + p
+    base = rng.lognormal(2.5, 1.2, n_sets * n_products)
+    base[::n_products] = rng.uniform(80, 400, n_sets)
+    walk = np.cumsum(rng.normal(0.005, 0.06, (n_sets * n_products, months)), axis=1)
+    premium = np.array([GRADE_PREMIUM.get(grade, 1.0) for grade in grades])
+    price = base[card_key] * np.exp(walk[card_key, m]) * np.where(is_box, 1.0, premium[g])
+    # a few unpriced rows, like missing listings
+    price[rng.random(n) < 0.02] = 0
+
+    mos_since_release = m - release_month[s]
+    # card names repeat across sets (reprints), booster boxes share one name like the real table
+    card_names = np.array([f"synthetic-mon-{key % 500}" for key in range(n_sets * n_products)], dtype=object)
+    card_names[::n_products] = "booster-box"
+    data = {
+        'date': dates[m],
+        'set_name': set_names[s],
+        'poke_id': card_key,
+        'poke_name': card_names[card_key],
+        'poke_no': p,
+        'grade': np.array(grades, dtype=object)[g],
+        'product_type': np.where(is_box, "sealed", "card"),
+        'price': np.round(price, 2),
+        'release_date': release_dates[s],
+        'set_year': release_dates.year.to_numpy()[s],
+        'mos_since_release': mos_since_release,
+    }
+
+    flags = {flag: rng.random(n_sets * n_products) < rate for flag, rate in FLAG_RATES.items()}
+    for flag, values in flags.items():
+        data[flag] = np.where(is_box, 0, values[card_key].astype(int))
+    data['ir_score'] = np.where(data['is_sir'] == 1, 2, data['is_ir'])
+
+    # set level metrics, one random walk per (set, month) repeated over the set's rows
+    set_walk = np.exp(np.cumsum(rng.normal(0.01, 0.05, (n_sets, months)), axis=1))
+    for metric in SET_METRICS:
+        level = rng.lognormal(4.5, 0.8, n_sets)
+        data[metric] = (level[:, None] * set_walk)[s, m]
+    data['top10_nm_card_mo_sum_in_set'] = data['top10_nm_card_mo_avg_in_set'] * 10
+    data['top10_mo_card_sum_to_bb_cost_ratio'] = data['top10_nm_card_mo_sum_in_set'] / data['bb_mo_price_by_set']
+
+    df = pd.DataFrame(data)
+    return conform_dtypes(df) if compact else df
+
+def make_feature_set_rows(rows, months=48, grades=GRADES, seed=0, compact=True):
+    """
+    Generates roughly `rows` rows, growing the number of sets and cards per set with the target size.
+    """
+    # about 60% of the (set, card, grade, month) grid is after the sets' release
+    combos = max(rows / (0.6 * months * len(grades)), 1)
+    n_sets = max(int(np.sqrt(combos / 2)), 1)
+    cards_per_set = max(int(combos / n_sets), 1)
+    return make_feature_set(n_sets=n_sets, cards_per_set=cards_per_set, months=months, grades=grades, seed=seed, compact=compact)
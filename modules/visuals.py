@@ -1,37 +1,78 @@
 import streamlit as st
+import io
+import re
 from pathlib import Path
 from PIL import Image
 
-# TODO: Put Average all time PSA 10 prices next to each of these sprites! Easier if we had a table to query from for this and many other aggs in this app
-def add_pokemon_sprites():
-    pokemon_names = [
-        "charizard", "venusaur", "blastoise", "articuno", "zapdos", "moltres", "dratini", "dragonair", 
-        "dragonite", "mewtwo", "mew", "gengar", "skarmory", "raikou", "entei", "suicune", "lugia", "ho-oh", 
-        "treecko", "grovyle", "sceptile", "torchic", "combusken", "blaziken", "mudkip", "marshtomp", "swampert", 
-        "flygon", "altaria", "milotic", "salamence", "metagross", "regirock", "registeel", "regice", "latias", 
-        "latios", "kyogre", "groudon", "rayquaza", "jirachi", "deoxys-normal"
-    ]
-    
-    # Loop through the list of Pokémon names
-    for pokemon in pokemon_names:
-        # Construct the image path based on the Pokémon name
+POKEMON_NAMES = [
+    "charizard", "venusaur", "blastoise", "articuno", "zapdos", "moltres", "dratini", "dragonair",
+    "dragonite", "mewtwo", "mew", "gengar", "skarmory", "raikou", "entei", "suicune", "lugia", "ho-oh",
+    "treecko", "grovyle", "sceptile", "torchic", "combusken", "blaziken", "mudkip", "marshtomp", "swampert",
+    "flygon", "altaria", "milotic", "salamence", "metagross", "regirock", "registeel", "regice", "latias",
+    "latios", "kyogre", "groudon", "rayquaza", "jirachi", "deoxys-normal"
+]
+
+@st.cache_resource
+def load_sprites(scale=0.7):
+    """
+    Resizes every sprite once per process and keeps the PNG bytes in memory, so rendering the sidebar
+    doesn't touch the filesystem (which may be read-only in the container).
+    """
+    sprites = {}
+    for pokemon in POKEMON_NAMES:
         image_path = Path(__file__).parent / "images" / f"{pokemon.lower()}.png"
-        
-        # Open the image using PIL to resize it
         with Image.open(image_path) as img:
-            # Resize the image to half of its original width (adjust as necessary)
             width, height = img.size
-            new_width = int(width * 0.7)  # Resize to 50% of the original width
-            new_height = int(height * 0.7)  # Resize to 50% of the original height
-            img = img.resize((new_width, new_height))
+            img = img.resize((int(width * scale), int(height * scale)))
+            buffer = io.BytesIO()
+            img.save(buffer, format="PNG")
+        sprites[pokemon] = buffer.getvalue()
+    return sprites
+
+def grade_label(grade):
+    # psa_10 -> PSA 10, nearmint -> nearmint
+    return grade.replace("_", " ").upper() if grade.startswith("psa") else grade
+
+def sprite_stats(df, grade="psa_10"):
+    """
+    Average all time price of the cards featuring each sprite's pokemon, for the sidebar captions. Computed once
+    per data version (app.load_sprite_stats) or by the precompute job, not per render.
+
+    Prices are summed per distinct poke_name first, so the name matching runs over a few thousand names
+    instead of every row. Unpriced (0) rows are left out.
 
-            # Save the resized image temporarily
-            resized_image_path = Path(__file__).parent / "images" / f"resized_{pokemon.lower()}.png"
-            img.save(resized_image_path)
+    Args:
+        df: feature_set rows of every month (e.g. the movers columns), not a date window, with poke_name, grade
+            and price.
 
-        # Display the resized image in the sidebar
-        st.sidebar.image(str(resized_image_path), use_column_width=False)
+    Returns:
+        {pokemon: avg price} of the sprites with priced cards in grade.
+    """
+    graded = df.loc[(df['grade'] == grade) & (df['price'] > 0)]
+    per_name = graded.groupby('poke_name', observed=True)['price'].agg(['sum', 'count'])
+    names = per_name.index.astype(str)
+
+    stats = {}
+    for pokemon in POKEMON_NAMES:
+        # card names are hyphenated, e.g. charizard-ex; the sprite for deoxys is its normal forme
+        term = re.escape(pokemon.removesuffix("-normal"))
+        matches = names.str.contains(rf"(?:^|-){term}(?:-|$)")
+        count = per_name['count'][matches].sum()
+        if count:
+            stats[pokemon] = float(per_name['sum'][matches].sum() / count)
+    return stats
+
+def add_pokemon_sprites(stats=None, grade="psa_10"):
+    """
+    Adds the sprites to the sidebar.
+
+    Args:
+        stats: optional {pokemon: avg price} lookup (see sprite_stats), shown as each sprite's caption.
+        grade: the grade stats were computed for, for the caption.
+    """
+    for pokemon, image in load_sprites().items():
+        caption = f"avg {grade_label(grade)}: ${stats[pokemon]:,.0f}" if stats and pokemon in stats else None
+        st.sidebar.image(image, caption=caption)
 
         # Add some vertical space between the images
         st.sidebar.markdown("<br>", unsafe_allow_html=True)
-
@@ -1,9 +1,94 @@
-import matplotlib.pyplot as plt
-import seaborn as sns
 import pandas as pd 
+import hashlib
+import io
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from modules.instrument import record_stage, stage
+
+
+# matplotlib and seaborn take over a second to import, so they're loaded by the first figure rather than on import,
+# and the theme is applied once per process rather than by every Plotter
+_themed = False
+_theme_lock = threading.Lock()
+
+def _pyplot():
+    global _themed
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    with _theme_lock:
+        if not _themed:
+            sns.set_theme(style='darkgrid')
+            _themed = True
+    return plt, sns
+
+def figure_to_bytes(fig, format="png", dpi=200):
+    """
+    Renders a figure to image bytes (same savefig settings as st.pyplot) and closes it, so figures don't pile up
+    in matplotlib's figure manager across reruns.
+    """
+    import matplotlib.pyplot as plt
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=format, dpi=dpi, bbox_inches="tight")
+    plt.close(fig)
+    return buffer.getvalue()
+
+def data_fingerprint(data, columns):
+    # hash of the plotted columns' values, so an equal frame rebuilt on a rerun maps to the same cache entry
+    hashed = pd.util.hash_pandas_object(data[list(columns)], index=False).to_numpy()
+    return hashlib.blake2b(hashed.tobytes(), digest_size=16).hexdigest()
+
+def _usable_cpus():
+    # cpus this process may run on (a container's cpuset, not the host's count)
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+# render workers per process, each one holds its own matplotlib import (~100MB), so a few are plenty
+MAX_RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", min(4, _usable_cpus())))
+
+# one pool per process, kept across reruns since spawning workers costs more than most charts
+_pool = None
+_pool_lock = threading.Lock()
+
+def _render_pool(max_workers=None):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn rather than fork, forking a threaded streamlit server can deadlock the children
+            _pool = ProcessPoolExecutor(max_workers=max_workers or MAX_RENDER_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                                        initializer=_init_render_worker)
+        return _pool
+
+def _reset_render_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+def _init_render_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+def _render_spec(settings, spec):
+    # returns the image and the seconds it took, so the parent can record per chart timings
+    start = time.perf_counter()
+    spec = dict(spec)
+    format = spec.pop('format', "png")
+    return figure_to_bytes(Plotter(**settings).plot_basic(**spec), format=format), time.perf_counter() - start
 
 
 class Plotter:
+    # rendered images shared by every Plotter instance, least recently used evicted first
+    _render_cache = OrderedDict()
+    _render_lock = threading.Lock()
+    max_cached_renders = 64
+
     def __init__(self, figsize=(15, 8), style="whitegrid", title="Plot", xlabel="X-axis", ylabel="Y-axis"):
         """
         Initializes the Plotter class with basic plot settings.
@@ -21,10 +106,6 @@ class Plotter:
         self.xlabel = xlabel
         self.ylabel = ylabel
 
-        # Apply Seaborn style
-        sns.set_style(self.style)
-        sns.set_theme(style='darkgrid')
-
     def plot_basic(self, data, x, y, kind="line", hue=None, marker=""):
         """
         Plots a basic chart based on the given data and plot type.
@@ -35,7 +116,12 @@ class Plotter:
             y: Column name or data for the y-axis.
             kind: Type of plot to create (e.g., "line", "scatter", "bar"), default is "line".
         """
+        # Drop categories missing from this slice, otherwise seaborn puts every set in the legend
+        if hue is not None and isinstance(data[hue].dtype, pd.CategoricalDtype):
+            data = data.assign(**{hue: data[hue].cat.remove_unused_categories()})
+
         # Create a new figure and axis
+        plt, sns = _pyplot()
         fig, ax = plt.subplots(figsize=self.figsize)
 
         if kind == "line":
@@ -53,11 +139,105 @@ class Plotter:
         ax.grid(visible=True, color='gray', linestyle='--', linewidth=0.5)
         ax.tick_params(axis='both', which='major', labelsize=12)
 
-        ax.legend(loc="upper left")
+        if hue is not None:
+            ax.legend(loc="upper left")
 
         # Return the figure for further use
         return fig
     
+    def render_basic(self, data, x, y, kind="line", hue=None, marker="", format="png"):
+        """
+        Same as plot_basic but returns the rendered image bytes (png or svg), cached by a fingerprint of the
+        plotted data plus the plot settings, so reruns that don't change the data skip rendering.
+        """
+        key = self._render_key(data, x, y, kind, hue, marker, format)
+        image = self._cached_render(key)
+        if image is not None:
+            record_stage(f"chart: {y}", 0.0, rows_in=len(data), cached=True)
+            return image
+
+        with stage(f"chart: {y}", rows_in=len(data)) as info:
+            image = figure_to_bytes(self.plot_basic(data, x, y, kind=kind, hue=hue, marker=marker), format=format)
+            info['cached'] = False
+        self._store_render(key, image)
+        return image
+
+    def render_many(self, specs, max_workers=None):
+        """
+        Renders a batch of charts concurrently in a process pool and returns their image bytes in order.
+
+        Args:
+            specs: list of dicts of render_basic arguments (data, x, y, kind, hue, marker, format). A spec can also
+                override this plotter's title, xlabel or ylabel.
+            max_workers: pool size, defaults to MAX_RENDER_WORKERS (RENDER_WORKERS env var, at most 4).
+        """
+        images = [None] * len(specs)
+        jobs = []
+        for i, spec in enumerate(specs):
+            spec = dict(spec)
+            settings = self.settings()
+            settings.update({name: spec.pop(name) for name in ('title', 'xlabel', 'ylabel') if name in spec})
+            plotter = Plotter(**settings)
+            key = plotter._render_key(spec['data'], spec['x'], spec['y'], spec.get('kind', "line"), spec.get('hue'),
+                                      spec.get('marker', ""), spec.get('format', "png"))
+            images[i] = self._cached_render(key)
+            if images[i] is not None:
+                record_stage(f"chart {i}: {spec['y']}", 0.0, rows_in=len(spec['data']), cached=True)
+            else:
+                # only the plotted columns are pickled over to the worker
+                columns = [col for col in (spec['x'], spec['y'], spec.get('hue')) if col is not None]
+                spec['data'] = spec['data'][columns]
+                jobs.append((i, key, settings, spec))
+
+        if len(jobs) > 1 and (max_workers or MAX_RENDER_WORKERS) > 1:
+            try:
+                pool = _render_pool(max_workers)
+                futures = [(i, key, pool.submit(_render_spec, settings, spec)) for i, key, settings, spec in jobs]
+                for i, key, future in futures:
+                    images[i], seconds = future.result()
+                    self._store_render(key, images[i])
+                    record_stage(f"chart {i}: {specs[i]['y']}", seconds, rows_in=len(specs[i]['data']), cached=False, worker=True)
+                jobs = []
+            except BrokenProcessPool as e:
+                print(f"render_many(): process pool failed ({e}), rendering inline")
+                _reset_render_pool()
+                jobs = [job for job in jobs if images[job[0]] is None]
+
+        # single misses, single cpu hosts (or a broken pool) aren't worth the round trip to a worker
+        for i, key, settings, spec in jobs:
+            images[i], seconds = _render_spec(settings, spec)
+            self._store_render(key, images[i])
+            record_stage(f"chart {i}: {spec['y']}", seconds, rows_in=len(spec['data']), cached=False, worker=False)
+        return images
+
+    @staticmethod
+    def show(container, image):
+        # draws a render_basic/render_many result into a streamlit container (st, st.sidebar, an st.empty slot...)
+        container.image(image)
+
+    def settings(self):
+        return {'figsize': self.figsize, 'style': self.style, 'title': self.title, 'xlabel': self.xlabel, 'ylabel': self.ylabel}
+
+    def _render_key(self, data, x, y, kind, hue, marker, format):
+        columns = [col for col in (x, y, hue) if col is not None]
+        return (data_fingerprint(data, columns), x, y, kind, hue, marker, format,
+                self.figsize, self.style, self.title, self.xlabel, self.ylabel)
+
+    @staticmethod
+    def _cached_render(key):
+        with Plotter._render_lock:
+            if key in Plotter._render_cache:
+                Plotter._render_cache.move_to_end(key)
+                return Plotter._render_cache[key]
+        return None
+
+    @staticmethod
+    def _store_render(key, image):
+        with Plotter._render_lock:
+            Plotter._render_cache[key] = image
+            while len(Plotter._render_cache) > Plotter.max_cached_renders:
+                Plotter._render_cache.popitem(last=False)
+    
     def plot_is_columns_bar_plot(self, summary_df):
         # Filter the rows from summary_df that have 'is_' in the index
         col_names = [index for index in summary_df.index if index.startswith('is_')]
@@ -67,6 +247,7 @@ class Plotter:
         # Sort the DataFrame by the 'mean' column (smallest to largest)
         is_df = is_df.sort_values(by="mean", ascending=True)
 
+        plt, _ = _pyplot()
         fig, ax = plt.subplots(figsize=(9, 6))
         
         # Plot the 'mean' values as a bar plot
@@ -103,17 +284,19 @@ class Plotter:
             weights_column: Column name for the counts or weights (e.g., 'count').
             bins: Number of bins in the histogram, default is 10.
         """
+        plt, sns = _pyplot()
         fig, ax = plt.subplots(figsize=self.figsize)
         
-        # Ensure the 'weights_column' is numeric
-        data[weights_column] = pd.to_numeric(data[weights_column], errors='coerce')
-        
         # Verify that the weights_column exists in the data
         if weights_column not in data.columns:
             raise ValueError(f"Column '{weights_column}' not found in DataFrame")
 
-        # Sort data by the weights_column in ascending order
-        sorted_data = data.sort_values(by=weights_column, ascending=True)
+        # Ensure the 'weights_column' is numeric (the rollup's counts already are)
+        if not pd.api.types.is_numeric_dtype(data[weights_column]):
+            data = data.assign(**{weights_column: pd.to_numeric(data[weights_column], errors='coerce')})
+
+        # Sort data by the weights_column in ascending order, unless it already is
+        sorted_data = data if data[weights_column].is_monotonic_increasing else data.sort_values(by=weights_column, ascending=True)
 
         # Plot using seaborn's histplot with weights
         sns.histplot(data=sorted_data, x=x, weights=sorted_data[weights_column], bins=bins, ax=ax, alpha=1)
@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+import pytest
+from modules.card_features import card_features, rolling_features
+from modules.movers import compute_movers
+from modules.synthetic import make_feature_set_rows
+
+
+WINDOW = 6
+
+@pytest.fixture(scope="module")
+def df():
+    df = make_feature_set_rows(20000)
+    # some unpriced months
+    rng = np.random.default_rng(1)
+    df['price'] = df['price'].astype('float64')
+    df.loc[rng.random(len(df)) < 0.05, 'price'] = 0.0
+    return df
+
+def pandas_features(df, window=WINDOW):
+    # the same features with per series groupby/rolling, sorted by (poke_id, grade, date)
+    d = df[['poke_id', 'grade', 'date', 'price']].sort_values(['poke_id', 'grade', 'date'], kind='stable')
+    d['price'] = d['price'].astype('float64').where(d['price'] > 0)
+    keys = [d['poke_id'], d['grade']]
+    prices = d.groupby(keys, observed=True)['price']
+
+    ref = pd.DataFrame(index=d.index)
+    ref['price'] = d['price']
+    ref['ret_1m'] = prices.pct_change(fill_method=None)
+    ref[f'ret_{window}m'] = prices.pct_change(window, fill_method=None)
+    ref[f'vol_{window}m'] = (ref['ret_1m'].groupby(keys, observed=True).rolling(window, min_periods=2).std()
+                             .reset_index(level=[0, 1], drop=True))
+    ref['peak_price'] = prices.cummax()
+    ref['drawdown'] = d['price'] / ref['peak_price'] - 1
+    ref['max_drawdown'] = ref['drawdown'].groupby(keys, observed=True).cummin()
+    return ref
+
+def test_rolling_features_match_pandas(df):
+    ref = pandas_features(df)
+    got = rolling_features(df, WINDOW).loc[ref.index]
+    for col in ('ret_1m', f'ret_{WINDOW}m', f'vol_{WINDOW}m', 'drawdown'):
+        np.testing.assert_allclose(got[col].to_numpy(np.float64), ref[col].to_numpy(), rtol=1e-3, atol=1e-4, err_msg=col)
+    # pandas' cummax/cummin leave NaN at unpriced rows, where ours carry the running value
+    priced = ref['price'].notna().to_numpy()
+    for col in ('peak_price', 'max_drawdown'):
+        np.testing.assert_allclose(got[col].to_numpy(np.float64)[priced], ref[col].to_numpy()[priced], rtol=1e-3, atol=1e-4, err_msg=col)
+
+def test_unpriced_rows_have_no_returns(df):
+    got = rolling_features(df, WINDOW)
+    unpriced = (df['price'] <= 0).to_numpy()
+    assert unpriced.any()
+    assert got['ret_1m'][unpriced].isna().all()
+    assert got['drawdown'][unpriced].isna().all()
+    assert np.isfinite(got['ret_1m'].dropna()).all()
+
+def test_months_since_peak(df):
+    got = rolling_features(df, WINDOW)
+    d = df.sort_values(['poke_id', 'grade', 'date'], kind='stable')
+    for _, series in list(d.groupby(['poke_id', 'grade'], observed=True))[:100]:
+        prices = series['price'].astype('float64').where(series['price'] > 0).to_numpy()
+        months = series['date'].to_numpy().astype('datetime64[M]').astype(np.int64)
+        for i in range(len(prices)):
+            seen = prices[:i + 1]
+            # latest row at the running peak, the first row if nothing's been priced yet
+            peak = np.nanmax(seen) if np.isfinite(seen).any() else None
+            j = max((k for k in range(i + 1) if seen[k] == peak), default=0)
+            assert got.loc[series.index[i], 'months_since_peak'] == months[i] - months[j]
+
+def test_card_features_are_the_latest_row(df):
+    rows = rolling_features(df, WINDOW)
+    cards = card_features(df, WINDOW)
+    latest = df.assign(_row=np.arange(len(df))).sort_values('date', kind='stable').groupby(['poke_id', 'grade'], observed=True).tail(1)
+    assert len(cards) == len(latest)
+    expected = rows.iloc[latest['_row'].to_numpy()].set_index([latest['poke_id'].to_numpy(), latest['grade'].to_numpy()])
+    got = cards.set_index(['poke_id', 'grade']).loc[expected.index]
+    np.testing.assert_allclose(got['drawdown'].to_numpy(np.float64), expected['drawdown'].to_numpy(np.float64), equal_nan=True)
+
+def test_null_keys_are_skipped(df):
+    bad = df.copy()
+    bad['poke_id'] = bad['poke_id'].astype('float64')
+    bad.loc[bad.index[:50], 'poke_id'] = np.nan
+    clean = bad.dropna(subset=['poke_id'])
+
+    rows = rolling_features(bad, WINDOW)
+    assert rows['ret_1m'].iloc[:50].isna().all()
+    assert (rows['months_since_peak'].iloc[:50] == -1).all()
+    pd.testing.assert_frame_equal(card_features(bad, WINDOW), card_features(clean, WINDOW))
+    pd.testing.assert_frame_equal(compute_movers(bad), compute_movers(clean))
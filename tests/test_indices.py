@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+import pytest
+from modules.indices import MAJOR_INDICES, MarketIndices, index_columns
+from modules.synthetic import make_feature_set_rows
+
+
+@pytest.fixture(scope="module")
+def df():
+    return make_feature_set_rows(20000)[index_columns()]
+
+def test_incremental_update_matches_full_history(df):
+    full = MarketIndices(MAJOR_INDICES).update(df)
+
+    indices = MarketIndices(MAJOR_INDICES)
+    cutoff = df['date'].sort_values().iloc[len(df) // 2]
+    indices.update(df.loc[df['date'] < cutoff])
+    levels = indices.update(df.loc[df['date'] >= indices.last_month])
+    pd.testing.assert_frame_equal(levels, full)
+
+def test_null_keys_are_skipped(df):
+    bad = df.copy()
+    bad['poke_id'] = bad['poke_id'].astype('float64')
+    rows = np.flatnonzero(bad['grade'] == 'nearmint')[:5]
+    bad.loc[bad.index[rows], 'poke_id'] = np.nan
+    clean = bad.dropna(subset=['poke_id'])
+
+    levels = MarketIndices(MAJOR_INDICES).update(bad)
+    pd.testing.assert_frame_equal(levels, MarketIndices(MAJOR_INDICES).update(clean))
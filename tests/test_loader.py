@@ -0,0 +1,21 @@
+import pytest
+from sqlalchemy import create_engine, text
+from modules.loader import read_sql_compact
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'feature_set.db'}")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE feature_set (date TEXT, poke_id INTEGER, grade TEXT, price REAL)"))
+        rows = [{'date': '2024-01-01', 'poke_id': 16777216 + i, 'grade': 'psa_10', 'price': 10.5} for i in range(4)]
+        # a null id in the second chunk, which the driver hands over as float64
+        rows[2]['poke_id'] = None
+        conn.execute(text("INSERT INTO feature_set VALUES (:date, :poke_id, :grade, :price)"), rows)
+    return engine
+
+def test_ids_above_float32_precision_stay_distinct(engine):
+    df = read_sql_compact("SELECT * FROM feature_set", engine, chunksize=2)
+    assert df['poke_id'].isna().sum() == 1
+    assert df['poke_id'].dropna().tolist() == [16777216, 16777217, 16777219]
+    assert df['price'].dtype == 'float32'
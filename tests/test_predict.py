@@ -0,0 +1,114 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from modules.predict import PredictionClient
+
+
+# stand-in for the model endpoint: price = num_grade * 1.5, POST /batch scores a list, and POST /flaky answers
+# 503 to its first `failures` requests
+class ModelHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        with server.lock:
+            server.paths.append(self.path)
+            failing = self.path == '/flaky' and server.failures > 0
+            if failing:
+                server.failures -= 1
+        if failing:
+            self.send_response(503)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        time.sleep(server.delay)
+        if self.path.endswith('/batch'):
+            server.batches.append(body)
+            result = [{'price': item['num_grade'] * 1.5} for item in body]
+        else:
+            result = {'price': body['num_grade'] * 1.5}
+        data = json.dumps(result).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ModelHandler)
+    server.lock = threading.Lock()
+    server.paths = []
+    server.batches = []
+    server.failures = 0
+    server.delay = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    server.url = f"http://127.0.0.1:{server.server_port}"
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_concurrent_identical_requests_are_coalesced(server):
+    server.delay = 0.3
+    client = PredictionClient(server.url)
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: client.predict({'num_grade': 10, 'set_name': 'base'}), range(8)))
+
+    assert results == [{'price': 15.0}] * 8
+    assert server.paths == ['/']
+    assert client.stats['misses'] == 1
+    assert client.stats['coalesced'] + client.stats['hits'] == 7
+
+def test_cache_hits_on_normalized_inputs(server):
+    client = PredictionClient(server.url)
+    assert client.predict({'num_grade': 9, 'is_holo': True}) == {'price': 13.5}
+    # same input with different key order and numeric strings
+    assert client.predict({'is_holo': 1, 'num_grade': '9.0'}) == {'price': 13.5}
+    assert len(server.paths) == 1
+    assert client.stats['hits'] == 1
+
+def test_cached_results_expire_after_ttl(server):
+    client = PredictionClient(server.url, ttl=0.2)
+    client.predict({'num_grade': 10})
+    client.predict({'num_grade': 10})
+    assert len(server.paths) == 1
+
+    time.sleep(0.3)
+    client.predict({'num_grade': 10})
+    assert len(server.paths) == 2
+
+def test_batch_dedups_and_skips_cached_inputs(server):
+    client = PredictionClient(server.url)
+    client.predict({'num_grade': 10})
+
+    results = client.predict_batch([{'num_grade': 9}, {'num_grade': 10}, {'num_grade': 9}, {'num_grade': 8}])
+    assert results == [{'price': 13.5}, {'price': 15.0}, {'price': 13.5}, {'price': 12.0}]
+    # one round trip, each uncached input scored once
+    assert server.batches == [[{'num_grade': 9}, {'num_grade': 8}]]
+
+    client.predict_batch([{'num_grade': 8}, {'num_grade': 9}])
+    assert len(server.batches) == 1
+
+def test_retries_on_503(server):
+    server.failures = 2
+    client = PredictionClient(f"{server.url}/flaky", retries=3)
+    assert client.predict({'num_grade': 10}) == {'price': 15.0}
+    assert server.paths == ['/flaky'] * 3
+
+def test_gives_up_after_retries(server):
+    server.failures = 5
+    client = PredictionClient(f"{server.url}/flaky", retries=1)
+    with pytest.raises(requests.exceptions.RetryError):
+        client.predict({'num_grade': 10})
+    assert len(server.paths) == 2
+    # failures aren't cached
+    server.failures = 0
+    assert client.predict({'num_grade': 10}) == {'price': 15.0}
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from modules.similarity import SIMILARITY_FLAGS, SimilarCards, attribute_code
+from modules.synthetic import make_feature_set_rows
+
+
+@pytest.fixture(scope="module")
+def df():
+    return make_feature_set_rows(20000)
+
+def test_ir_score_comes_from_the_flags_without_the_column(df):
+    # feature_set has is_ir/is_sir but no ir_score column
+    from_flags = SimilarCards.from_frame(df.drop(columns=['ir_score']))
+    from_score = SimilarCards.from_frame(df)
+    np.testing.assert_array_equal(from_flags.cards, from_score.cards)
+    np.testing.assert_array_equal(from_flags.counts, from_score.counts)
+
+def test_sir_query_matches_sir_cards(df):
+    similar = SimilarCards.from_frame(df.drop(columns=['ir_score']))
+    sir = df.loc[(df['is_sir'] == 1) & (df['grade'] == 'psa_10') & (df['price'] > 0) & (df['mos_since_release'] >= 0)]
+    assert len(sir)
+    flags = sir.iloc[0][SIMILARITY_FLAGS].to_dict()
+    codes, distance, n_cards = similar.matches(attribute_code(flags, ir_score=2), 'psa_10', min_cards=1)
+    assert distance == 0
+    assert n_cards > 0
+
+def test_roundtrip_through_frames(df):
+    similar = SimilarCards.from_frame(df)
+    restored = SimilarCards.from_buckets(*similar.to_frames())
+    trajectory, distance, n_cards = similar.trajectory({'is_full_art': 1}, ir_score=1, grade='psa_10')
+    restored_trajectory, restored_distance, restored_n = restored.trajectory({'is_full_art': 1}, ir_score=1, grade='psa_10')
+    assert (distance, n_cards) == (restored_distance, restored_n)
+    np.testing.assert_allclose(trajectory['avg_price'], restored_trajectory['avg_price'])